@@ -1,6 +1,10 @@
 import streamlit as st
+import database as db
 
 st.set_page_config(page_title="Página Principal")
 
+# Cópias de segurança automáticas, iniciadas uma única vez por processo
+db.iniciar_backups()
+
 st.title("Bem-vindo à Página Principal!")
 st.write("Use a barra lateral para navegar para outras páginas.")
\ No newline at end of file
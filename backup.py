@@ -0,0 +1,256 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Pasta onde ficam as cópias comprimidas da base de dados
+PASTA_BACKUPS = os.environ.get("DEMANDAS_BACKUP_PASTA", "backups")
+
+# Número de cópias mantidas; as mais antigas são apagadas
+MAXIMO_BACKUPS = int(os.environ.get("DEMANDAS_BACKUP_MAXIMO", "14"))
+
+# Intervalo entre cópias automáticas (0 desativa o agendador)
+INTERVALO_HORAS = float(os.environ.get("DEMANDAS_BACKUP_INTERVALO_HORAS", "6"))
+
+# A cópia é feita em pequenos passos para que quem escreve nunca fique bloqueado por muito tempo
+PAGINAS_POR_PASSO = 64
+PAUSA_ENTRE_PASSOS = 0.005
+
+NOME_THREAD = "backup-demandas"
+PREFIXO = "demandas_"
+EXTENSAO = ".db.gz"
+EXTENSAO_TEMPORARIA = ".db.tmp"
+
+# Cópias por comprimir mais antigas do que isto ficaram de um backup interrompido
+IDADE_TEMPORARIO_ORFAO = 24 * 3600
+
+
+def verificar_integridade(caminho_banco):
+    """
+    Executa 'PRAGMA integrity_check' e conta as linhas de cada tabela.
+    Retorna um tuplo (integro, contagens), onde contagens é um dicionário tabela -> nº de linhas.
+    """
+    conn = sqlite3.connect(caminho_banco)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA integrity_check")
+    integro = cursor.fetchone()[0] == "ok"
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    tabelas = [linha[0] for linha in cursor.fetchall()]
+    contagens = {}
+    for tabela in tabelas:
+        cursor.execute(f'SELECT COUNT(*) FROM "{tabela}"')
+        contagens[tabela] = cursor.fetchone()[0]
+    conn.close()
+    return integro, contagens
+
+
+def _manifesto(arquivo):
+    return arquivo[:-len(EXTENSAO)] + ".json"
+
+
+def listar_backups(pasta=PASTA_BACKUPS):
+    """
+    Lista as cópias existentes, da mais recente para a mais antiga,
+    com os dados guardados no manifesto de cada uma.
+    """
+    if not os.path.isdir(pasta):
+        return []
+    backups = []
+    for nome in sorted(os.listdir(pasta), reverse=True):
+        if not (nome.startswith(PREFIXO) and nome.endswith(EXTENSAO)):
+            continue
+        arquivo = os.path.join(pasta, nome)
+        relatorio = {"arquivo": arquivo}
+        try:
+            with open(_manifesto(arquivo), encoding="utf-8") as f:
+                relatorio.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        backups.append(relatorio)
+    return backups
+
+
+def _rotacionar(pasta):
+    for relatorio in listar_backups(pasta)[MAXIMO_BACKUPS:]:
+        for caminho in (relatorio["arquivo"], _manifesto(relatorio["arquivo"])):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+    # Cópias por comprimir deixadas por um processo que terminou a meio de um backup
+    limite = time.time() - IDADE_TEMPORARIO_ORFAO
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        if nome.startswith(PREFIXO) and nome.endswith(EXTENSAO_TEMPORARIA) and os.path.getmtime(caminho) < limite:
+            os.remove(caminho)
+
+
+def criar_backup(caminho_banco, pasta=PASTA_BACKUPS, rotacionar=True):
+    """
+    Copia a base de dados em funcionamento com a API de backup do SQLite,
+    verifica a cópia, comprime-a e, se 'rotacionar', apaga as cópias mais antigas.
+    Retorna um dicionário com o relatório da operação, incluindo os tempos de cada etapa.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    carimbo = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    arquivo = os.path.join(pasta, f"{PREFIXO}{carimbo}{EXTENSAO}")
+
+    inicio = time.perf_counter()
+    fd, temporario = tempfile.mkstemp(prefix=PREFIXO, suffix=EXTENSAO_TEMPORARIA, dir=pasta)
+    os.close(fd)
+    try:
+        origem = sqlite3.connect(caminho_banco)
+        destino = sqlite3.connect(temporario)
+        origem.backup(destino, pages=PAGINAS_POR_PASSO, sleep=PAUSA_ENTRE_PASSOS)
+        destino.close()
+        origem.close()
+        fim_copia = time.perf_counter()
+
+        integro, contagens = verificar_integridade(temporario)
+        fim_verificacao = time.perf_counter()
+        if not integro:
+            raise sqlite3.DatabaseError("A cópia falhou no 'PRAGMA integrity_check'.")
+
+        with open(temporario, "rb") as entrada, gzip.open(arquivo, "wb") as saida:
+            shutil.copyfileobj(entrada, saida)
+        fim_compressao = time.perf_counter()
+
+        relatorio = {
+            "arquivo": arquivo,
+            "criado_em": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+            "integro": integro,
+            "contagens": contagens,
+            "tamanho_original": os.path.getsize(temporario),
+            "tamanho_comprimido": os.path.getsize(arquivo),
+            "segundos_copia": round(fim_copia - inicio, 3),
+            "segundos_verificacao": round(fim_verificacao - fim_copia, 3),
+            "segundos_compressao": round(fim_compressao - fim_verificacao, 3),
+            "segundos_total": round(fim_compressao - inicio, 3),
+        }
+        with open(_manifesto(arquivo), "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+    if rotacionar:
+        _rotacionar(pasta)
+    logger.info(
+        "Backup %s criado em %.3fs (cópia %.3fs, verificação %.3fs, compressão %.3fs).",
+        arquivo, relatorio["segundos_total"], relatorio["segundos_copia"],
+        relatorio["segundos_verificacao"], relatorio["segundos_compressao"]
+    )
+    return relatorio
+
+
+def restaurar_backup(arquivo, caminho_banco):
+    """
+    Substitui o conteúdo da base de dados pelo de uma cópia comprimida.
+    A cópia é descomprimida e verificada antes de tocar na base de dados; o estado
+    atual é guardado numa nova cópia para que a restauração possa ser desfeita.
+    """
+    fd, temporario = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        with gzip.open(arquivo, "rb") as entrada, open(temporario, "wb") as saida:
+            shutil.copyfileobj(entrada, saida)
+
+        integro, contagens = verificar_integridade(temporario)
+        if not integro:
+            raise sqlite3.DatabaseError(f"A cópia '{arquivo}' está corrompida.")
+        try:
+            with open(_manifesto(arquivo), encoding="utf-8") as f:
+                esperado = json.load(f).get("contagens")
+        except (OSError, ValueError):
+            esperado = None
+        if esperado is not None and esperado != contagens:
+            raise sqlite3.DatabaseError(f"As contagens de linhas de '{arquivo}' não coincidem com o manifesto.")
+
+        if os.path.exists(caminho_banco):
+            criar_backup(caminho_banco, os.path.dirname(arquivo) or ".", rotacionar=False)
+
+        origem = sqlite3.connect(temporario)
+        destino = sqlite3.connect(caminho_banco)
+        origem.backup(destino)
+        destino.close()
+        origem.close()
+    finally:
+        os.remove(temporario)
+    logger.info("Base de dados restaurada a partir de %s.", arquivo)
+    return contagens
+
+
+def _executar_agendador(caminho_banco, intervalo_horas, pasta):
+    intervalo = intervalo_horas * 3600
+    while True:
+        backups = listar_backups(pasta)
+        ultimo = os.path.getmtime(backups[0]["arquivo"]) if backups else 0
+        espera = ultimo + intervalo - time.time()
+        if espera > 0:
+            time.sleep(espera)
+            continue
+        try:
+            criar_backup(caminho_banco, pasta)
+        except Exception:
+            logger.exception("Falha no backup automático de %s.", caminho_banco)
+            time.sleep(min(intervalo, 600))
+
+
+def iniciar_agendador(caminho_banco, intervalo_horas=INTERVALO_HORAS, pasta=PASTA_BACKUPS):
+    """
+    Inicia, uma única vez por processo, uma thread em segundo plano que faz
+    uma cópia sempre que a mais recente tiver mais de 'intervalo_horas'.
+    """
+    if intervalo_horas <= 0:
+        return None
+    for thread in threading.enumerate():
+        if thread.name == NOME_THREAD and thread.is_alive():
+            return thread
+    thread = threading.Thread(
+        target=_executar_agendador, args=(caminho_banco, intervalo_horas, pasta),
+        name=NOME_THREAD, daemon=True
+    )
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backups da base de dados de demandas.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("criar", help="Cria uma nova cópia agora.")
+    subparsers.add_parser("listar", help="Lista as cópias existentes.")
+    parser_verificar = subparsers.add_parser("verificar", help="Verifica a integridade de uma cópia.")
+    parser_verificar.add_argument("arquivo")
+    parser_restaurar = subparsers.add_parser("restaurar", help="Restaura a base de dados a partir de uma cópia.")
+    parser_restaurar.add_argument("arquivo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    caminho_banco = os.environ.get("DEMANDAS_DB", "demandas.db")
+
+    if args.comando == "criar":
+        relatorio = criar_backup(caminho_banco)
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    elif args.comando == "listar":
+        for relatorio in listar_backups():
+            print(f"{relatorio['arquivo']}  {relatorio.get('criado_em', '')}  {relatorio.get('segundos_total', '?')}s")
+    elif args.comando == "verificar":
+        fd, temporario = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        with gzip.open(args.arquivo, "rb") as entrada, open(temporario, "wb") as saida:
+            shutil.copyfileobj(entrada, saida)
+        integro, contagens = verificar_integridade(temporario)
+        os.remove(temporario)
+        print("OK" if integro else "CORROMPIDO", json.dumps(contagens, ensure_ascii=False))
+    elif args.comando == "restaurar":
+        contagens = restaurar_backup(args.arquivo, caminho_banco)
+        print("Restauração concluída:", json.dumps(contagens, ensure_ascii=False))
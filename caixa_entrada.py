@@ -0,0 +1,99 @@
+from datetime import datetime
+import streamlit as st
+import pandas as pd
+import database as db
+import metricas
+
+# Intervalo, em segundos, entre verificações de novas demandas
+INTERVALO_ATUALIZACAO = 15
+
+
+def _expirado(ultimo):
+    """Indica se as remoções desde 'ultimo' já podem ter sido apagadas do registo."""
+    limite = (datetime.now() - db.RETENCAO_REMOCOES).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return ultimo < limite
+
+
+def _sincronizar(estado, setor):
+    """
+    Atualiza a lista guardada na sessão. Só consulta a tabela se db.versao_dados()
+    tiver mudado, e mesmo assim só traz as linhas alteradas ou apagadas desde a última vista.
+    Retorna o número de demandas novas recebidas.
+    """
+    versao = db.versao_dados()
+    if estado['df'] is not None and versao == estado['versao']:
+        return 0
+
+    if estado['df'] is None or estado['ultimo'] is None or _expirado(estado['ultimo']):
+        recebidas = db.consultar_caixa_entrada(setor=setor)
+        anteriores = set() if estado['df'] is None else set(estado['df']['id'])
+        df = recebidas
+    else:
+        # As alterações vêm de todos os setores: as que já não são deste setor saem da lista
+        recebidas = db.consultar_caixa_entrada(setor=setor, desde=estado['ultimo'])
+        removidas = db.consultar_demandas_removidas(desde=estado['ultimo'])
+        anteriores = set(estado['df']['id'])
+        df = pd.concat([estado['df'], recebidas]).drop_duplicates(subset='id', keep='last')
+        df = df[(df['setor_destino'] == setor) & ~df['id'].isin(removidas)]
+
+    novas = 0 if estado['df'] is None else len(set(recebidas.loc[recebidas['setor_destino'] == setor, 'id']) - anteriores)
+    if not recebidas.empty:
+        estado['ultimo'] = max(estado['ultimo'] or '', recebidas['atualizado_em'].max())
+    estado['df'] = df[df['status'].isin(metricas.STATUS_ABERTOS)]
+    estado['versao'] = versao
+    return novas
+
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO)
+def _painel(setor):
+    chave = f"caixa_entrada_{setor}"
+    if chave not in st.session_state:
+        st.session_state[chave] = {'df': None, 'versao': None, 'ultimo': None}
+    estado = st.session_state[chave]
+
+    novas = _sincronizar(estado, setor)
+    if novas:
+        st.toast(f"{novas} nova(s) demanda(s) recebida(s)!", icon="📥")
+
+    df = estado['df'].sort_values('id', ascending=False)
+    defensores = sorted(df['defensor'].dropna().unique())
+    filtro_defensor = st.selectbox("Filtrar por Defensor", options=["Todos"] + defensores, key=f"caixa_defensor_{setor}")
+    if filtro_defensor != "Todos": df = df[df['defensor'] == filtro_defensor]
+
+    col1, col2 = st.columns(2)
+    col1.metric("Pendentes", int((df['status'] == 'Pendente').sum()))
+    col2.metric("Lidas", int((df['status'] == 'Lido').sum()))
+
+    if df.empty:
+        st.info("Nenhuma demanda em aberto nesta caixa de entrada.")
+        return
+
+    for index, row in df.iterrows():
+        id_demanda = row['id']
+        status_color = "green" if row['status'] == 'Pendente' else 'orange'
+        with st.expander(f"**{row['nome_assistido']}** |  {row['defensor']}  |  Data: {row['data']} {row['horario']}  |  Status: :{status_color}[{row['status']}]"):
+            st.markdown(f"**Servidor:** {row['servidor']}  \n**CPF:** {row['cpf'] or '—'}  \n**Registo ID:** {id_demanda}")
+            st.write(row['demanda'])
+            col_lido, col_resolvido, _ = st.columns([1, 1, 3])
+            with col_lido:
+                if row['status'] == 'Pendente' and st.button("👁️ Marcar como lido", key=f"lido_{setor}_{id_demanda}"):
+                    db.atualizar_demanda(id_demanda, {'status': 'Lido'})
+                    st.rerun(scope="fragment")
+            with col_resolvido:
+                if st.button("✔️ Marcar como resolvido", key=f"resolvido_{setor}_{id_demanda}"):
+                    db.atualizar_demanda(id_demanda, {'status': 'Resolvido'})
+                    st.rerun(scope="fragment")
+
+
+def exibir_caixa_entrada(setor):
+    """
+    Monta a página de caixa de entrada de um setor. A lista é atualizada
+    automaticamente a cada INTERVALO_ATUALIZACAO segundos, sem recarregar a página.
+    """
+    st.set_page_config(layout="wide", page_title=f"Caixa de Entrada — {setor}")
+
+    st.title(f"📥 Caixa de Entrada — {setor}")
+    st.markdown(f"Demandas encaminhadas para **{setor}**. A lista é atualizada automaticamente a cada {INTERVALO_ATUALIZACAO} segundos.")
+    st.divider()
+
+    _painel(setor)
@@ -0,0 +1,354 @@
+import re
+import unicodedata
+from datetime import datetime
+from difflib import SequenceMatcher
+
+# Similaridade mínima para que um par seja proposto como candidato a mesclagem
+LIMIAR_SIMILARIDADE = 0.8
+
+# Blocos maiores do que isto (ex.: "MARIA SILVA") são ignorados para evitar comparações quadráticas
+TAMANHO_MAXIMO_BLOCO = 500
+
+PARTICULAS = {"DA", "DE", "DO", "DAS", "DOS", "E"}
+
+# Regras fonéticas para o português (adaptação do BuscaBR), aplicadas por ordem
+REGRAS_FONETICAS = [
+    (r"Y", "I"),
+    (r"PH", "F"),
+    (r"LH", "L"),
+    (r"NH", "N"),
+    (r"CH", "X"),
+    (r"B[RL]", "B"),
+    (r"G[RL]", "G"),
+    (r"G([EI])", r"J\1"),
+    (r"C([EI])", r"S\1"),
+    (r"CK|C|Q", "K"),
+    (r"TS|Z|X", "S"),
+    (r"W", "V"),
+    (r"N", "M"),
+    (r"A[OM]$", "M"),
+    (r"H", ""),
+    (r"[SRLM]$", ""),
+]
+
+
+def normalizar_nome(nome):
+    """Remove acentos, pontuação e espaços repetidos, devolvendo o nome em maiúsculas."""
+    if not nome:
+        return ""
+    nome = unicodedata.normalize("NFKD", str(nome).replace("ç", "s").replace("Ç", "S"))
+    nome = "".join(c for c in nome if not unicodedata.combining(c))
+    nome = re.sub(r"[^A-Z ]", " ", nome.upper())
+    return " ".join(nome.split())
+
+
+def normalizar_cpf(cpf):
+    """Devolve apenas os dígitos do CPF, ou uma string vazia se não tiver 11 dígitos."""
+    digitos = re.sub(r"[^0-9]", "", str(cpf or ""))
+    return digitos if len(digitos) == 11 else ""
+
+
+def codigo_fonetico(palavra):
+    """
+    Gera o código fonético de uma palavra já normalizada.
+    Grafias como 'THAIS'/'TAIZ' ou 'WELDER'/'VELDER' produzem o mesmo código.
+    """
+    codigo = palavra
+    for padrao, substituto in REGRAS_FONETICAS:
+        codigo = re.sub(padrao, substituto, codigo)
+    codigo = codigo[:1] + re.sub(r"[AEIOU]", "", codigo[1:])
+    codigo = re.sub(r"(.)\1+", r"\1", codigo)
+    return codigo or palavra[:1]
+
+
+def _tokens(nome_normalizado):
+    return [t for t in nome_normalizado.split() if t not in PARTICULAS]
+
+
+def identidade(nome, cpf):
+    """Chave que agrupa as demandas registadas exatamente com o mesmo nome e CPF."""
+    return f"{normalizar_nome(nome)}|{normalizar_cpf(cpf)}"
+
+
+def chaves_de_bloqueio(nome, cpf):
+    """
+    Devolve as chaves de bloqueio de um assistido. Só são comparados pares
+    que partilham pelo menos uma chave: o CPF normalizado, o código fonético
+    do primeiro e último nome e os prefixos desses dois nomes.
+    """
+    chaves = set()
+    cpf_normalizado = normalizar_cpf(cpf)
+    if cpf_normalizado:
+        chaves.add(f"cpf:{cpf_normalizado}")
+
+    tokens = _tokens(normalizar_nome(nome))
+    if tokens:
+        primeiro, ultimo = tokens[0], tokens[-1]
+        chaves.add(f"fon:{codigo_fonetico(primeiro)}:{codigo_fonetico(ultimo)}")
+        chaves.add(f"pre:{primeiro[:3]}:{ultimo[:3]}")
+    return chaves
+
+
+def similaridade(identidade_a, identidade_b):
+    """
+    Calcula a similaridade (0 a 1) entre duas identidades 'NOME|CPF'.
+    CPFs válidos e diferentes indicam pessoas distintas; CPFs iguais indicam a mesma pessoa.
+    """
+    nome_a, cpf_a = identidade_a.split("|")
+    nome_b, cpf_b = identidade_b.split("|")
+
+    if cpf_a and cpf_b and cpf_a != cpf_b:
+        return 0.0
+
+    fon_a = " ".join(codigo_fonetico(t) for t in _tokens(nome_a))
+    fon_b = " ".join(codigo_fonetico(t) for t in _tokens(nome_b))
+    pontuacao = (
+        SequenceMatcher(None, nome_a, nome_b).ratio() +
+        SequenceMatcher(None, fon_a, fon_b).ratio()
+    ) / 2
+
+    if cpf_a and cpf_a == cpf_b:
+        pontuacao = max(pontuacao, 0.95)
+    return round(pontuacao, 4)
+
+
+def _motivo(identidade_a, identidade_b):
+    cpf_a = identidade_a.split("|")[1]
+    cpf_b = identidade_b.split("|")[1]
+    if cpf_a and cpf_a == cpf_b:
+        return "Mesmo CPF com nomes diferentes"
+    if bool(cpf_a) != bool(cpf_b):
+        return "Registo com e sem CPF"
+    return "Nomes semelhantes"
+
+
+def criar_tabelas(cursor, chave_automatica):
+    """
+    Cria as tabelas do índice de duplicados, iguais nos dois backends.
+    'chave_automatica' é a declaração de uma coluna 'id' numerada automaticamente no dialeto do backend.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chaves_assistido (
+            demanda_id INTEGER NOT NULL,
+            chave TEXT NOT NULL,
+            identidade TEXT NOT NULL,
+            PRIMARY KEY (demanda_id, chave)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chaves_assistido_chave ON chaves_assistido (chave, identidade)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chaves_assistido_identidade ON chaves_assistido (identidade)")
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS candidatos_mesclagem (
+            id {chave_automatica},
+            identidade_a TEXT NOT NULL,
+            identidade_b TEXT NOT NULL,
+            demanda_a INTEGER NOT NULL,
+            demanda_b INTEGER NOT NULL,
+            similaridade DOUBLE PRECISION NOT NULL,
+            motivo TEXT,
+            status TEXT NOT NULL DEFAULT 'Pendente',
+            detectado_em TEXT NOT NULL,
+            UNIQUE (identidade_a, identidade_b)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_candidatos_mesclagem_status ON candidatos_mesclagem (status, similaridade)")
+
+
+def _registar_candidato(cursor, identidade_a, demanda_a, identidade_b, demanda_b, pontuacao):
+    """Guarda um par candidato, ordenado para que (A, B) e (B, A) sejam o mesmo registo."""
+    if identidade_b < identidade_a:
+        identidade_a, demanda_a, identidade_b, demanda_b = identidade_b, demanda_b, identidade_a, demanda_a
+    cursor.execute("""
+        INSERT INTO candidatos_mesclagem
+            (identidade_a, identidade_b, demanda_a, demanda_b, similaridade, motivo, detectado_em)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (identidade_a, identidade_b) DO UPDATE SET
+            similaridade = excluded.similaridade,
+            demanda_a = excluded.demanda_a,
+            demanda_b = excluded.demanda_b
+        WHERE candidatos_mesclagem.status = 'Pendente'
+    """, (
+        identidade_a, identidade_b, demanda_a, demanda_b, pontuacao,
+        _motivo(identidade_a, identidade_b), datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    ))
+
+
+def _descartar_candidatos_orfaos(cursor, identidades):
+    """Apaga candidatos pendentes de identidades que já não existem em nenhuma demanda."""
+    for ident in identidades:
+        cursor.execute("SELECT 1 FROM chaves_assistido WHERE identidade = ? LIMIT 1", (ident,))
+        if cursor.fetchone() is None:
+            cursor.execute(
+                "DELETE FROM candidatos_mesclagem WHERE status = 'Pendente' AND (identidade_a = ? OR identidade_b = ?)",
+                (ident, ident)
+            )
+
+
+def _reapontar_candidatos(cursor, demanda_id):
+    """
+    Faz os candidatos que apontam para uma demanda apagada ou com outra identidade
+    apontarem para a demanda mais antiga que ainda tenha a identidade do candidato.
+    """
+    for lado in ("a", "b"):
+        cursor.execute(f"""
+            UPDATE candidatos_mesclagem
+            SET demanda_{lado} = COALESCE(
+                (SELECT MIN(demanda_id) FROM chaves_assistido WHERE identidade = candidatos_mesclagem.identidade_{lado}),
+                demanda_{lado}
+            )
+            WHERE demanda_{lado} = ?
+        """, (demanda_id,))
+
+
+def _remover_chaves(cursor, demanda_id):
+    """Remove as chaves de uma demanda, devolvendo as identidades que ela tinha."""
+    cursor.execute("SELECT DISTINCT identidade FROM chaves_assistido WHERE demanda_id = ?", (demanda_id,))
+    anteriores = [linha[0] for linha in cursor.fetchall()]
+    cursor.execute("DELETE FROM chaves_assistido WHERE demanda_id = ?", (demanda_id,))
+    return anteriores
+
+
+def indexar_demanda(cursor, demanda_id, nome, cpf, limiar=LIMIAR_SIMILARIDADE):
+    """
+    Atualiza as chaves de uma demanda e compara-a apenas com as identidades
+    dos mesmos blocos. Usado a cada inserção ou edição de nome/CPF.
+    Devolve o número de candidatos encontrados.
+    """
+    anteriores = _remover_chaves(cursor, demanda_id)
+
+    ident = identidade(nome, cpf)
+    chaves = chaves_de_bloqueio(nome, cpf)
+    cursor.executemany(
+        "INSERT INTO chaves_assistido (demanda_id, chave, identidade) VALUES (?, ?, ?)",
+        [(demanda_id, chave, ident) for chave in chaves]
+    )
+    _descartar_candidatos_orfaos(cursor, [i for i in anteriores if i != ident])
+    if ident not in anteriores:
+        _reapontar_candidatos(cursor, demanda_id)
+    if not chaves:
+        return 0
+
+    # Tal como em reconstruir_indice(), blocos com mais de TAMANHO_MAXIMO_BLOCO identidades são ignorados
+    placeholders = ", ".join(["?"] * len(chaves))
+    cursor.execute(f"""
+        SELECT identidade, MIN(demanda_id) FROM chaves_assistido
+        WHERE chave IN (
+            SELECT chave FROM chaves_assistido
+            WHERE chave IN ({placeholders})
+            GROUP BY chave
+            HAVING COUNT(DISTINCT identidade) <= ?
+        ) AND identidade != ?
+        GROUP BY identidade
+    """, (*chaves, TAMANHO_MAXIMO_BLOCO, ident))
+
+    encontrados = 0
+    for outra_identidade, outra_demanda in cursor.fetchall():
+        pontuacao = similaridade(ident, outra_identidade)
+        if pontuacao >= limiar:
+            _registar_candidato(cursor, ident, demanda_id, outra_identidade, outra_demanda, pontuacao)
+            encontrados += 1
+    return encontrados
+
+
+def remover_demanda(cursor, demanda_id):
+    """Remove as chaves de uma demanda apagada e os candidatos que deixaram de fazer sentido."""
+    _descartar_candidatos_orfaos(cursor, _remover_chaves(cursor, demanda_id))
+    _reapontar_candidatos(cursor, demanda_id)
+
+
+def reconstruir_indice(cursor, limiar=LIMIAR_SIMILARIDADE):
+    """
+    Processamento em lote: recria todas as chaves a partir da tabela 'demandas'
+    e compara as identidades bloco a bloco. Devolve o número de candidatos encontrados.
+    """
+    cursor.execute("DELETE FROM chaves_assistido")
+    cursor.execute("DELETE FROM candidatos_mesclagem WHERE status = 'Pendente'")
+    cursor.execute("SELECT id, nome_assistido, cpf FROM demandas")
+    linhas = []
+    for demanda_id, nome, cpf in cursor.fetchall():
+        ident = identidade(nome, cpf)
+        linhas.extend((demanda_id, chave, ident) for chave in chaves_de_bloqueio(nome, cpf))
+    cursor.executemany("INSERT INTO chaves_assistido (demanda_id, chave, identidade) VALUES (?, ?, ?)", linhas)
+
+    cursor.execute("""
+        SELECT chave, identidade, MIN(demanda_id) FROM chaves_assistido
+        GROUP BY chave, identidade
+        ORDER BY chave
+    """)
+    blocos = {}
+    for chave, ident, demanda_id in cursor.fetchall():
+        blocos.setdefault(chave, []).append((ident, demanda_id))
+
+    pares = {}
+    for membros in blocos.values():
+        if len(membros) < 2 or len(membros) > TAMANHO_MAXIMO_BLOCO:
+            continue
+        for i, (ident_a, demanda_a) in enumerate(membros):
+            for ident_b, demanda_b in membros[i + 1:]:
+                par = tuple(sorted((ident_a, ident_b)))
+                if par in pares:
+                    continue
+                pontuacao = similaridade(ident_a, ident_b)
+                pares[par] = pontuacao
+                if pontuacao >= limiar:
+                    _registar_candidato(cursor, ident_a, demanda_a, ident_b, demanda_b, pontuacao)
+
+    return sum(1 for p in pares.values() if p >= limiar)
+
+
+def mesclar(cursor, candidato_id, manter="a"):
+    """
+    Aplica o nome e o CPF da identidade mantida a todas as demandas da outra
+    identidade do par e marca o candidato como 'Mesclado'. Se a identidade mantida
+    não tiver CPF, fica o CPF da outra, aplicado às demandas das duas.
+    Devolve a lista de IDs de demandas alteradas.
+    """
+    cursor.execute(
+        "SELECT identidade_a, identidade_b, demanda_a, demanda_b FROM candidatos_mesclagem WHERE id = ?",
+        (candidato_id,)
+    )
+    candidato = cursor.fetchone()
+    if candidato is None:
+        return []
+    identidade_a, identidade_b, demanda_a, demanda_b = candidato
+    if manter == "a":
+        demanda_mantida, identidade_mantida = demanda_a, identidade_a
+        demanda_descartada, identidade_descartada = demanda_b, identidade_b
+    else:
+        demanda_mantida, identidade_mantida = demanda_b, identidade_b
+        demanda_descartada, identidade_descartada = demanda_a, identidade_a
+
+    cursor.execute("SELECT nome_assistido, cpf FROM demandas WHERE id = ?", (demanda_mantida,))
+    mantida = cursor.fetchone()
+    if mantida is None:
+        return []
+    nome, cpf = mantida
+
+    identidades = [identidade_descartada]
+    if not normalizar_cpf(cpf):
+        cursor.execute("SELECT cpf FROM demandas WHERE id = ?", (demanda_descartada,))
+        descartada = cursor.fetchone()
+        if descartada and normalizar_cpf(descartada[0]):
+            cpf = descartada[0]
+            identidades.append(identidade_mantida)
+
+    cursor.execute("UPDATE candidatos_mesclagem SET status = 'Mesclado' WHERE id = ?", (candidato_id,))
+
+    placeholders = ", ".join(["?"] * len(identidades))
+    cursor.execute(
+        f"SELECT DISTINCT demanda_id FROM chaves_assistido WHERE identidade IN ({placeholders}) ORDER BY demanda_id",
+        tuple(identidades)
+    )
+    ids = [linha[0] for linha in cursor.fetchall()]
+    for demanda_id in ids:
+        cursor.execute("UPDATE demandas SET nome_assistido = ?, cpf = ? WHERE id = ?", (nome, cpf, demanda_id))
+        indexar_demanda(cursor, demanda_id, nome, cpf)
+    return ids
+
+
+if __name__ == "__main__":
+    import database as db
+    print("A procurar assistidos duplicados...")
+    total = db.detectar_duplicados()
+    print(f"{total} candidato(s) a mesclagem encontrado(s).")
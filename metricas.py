@@ -0,0 +1,169 @@
+from datetime import datetime
+
+# Limites superiores (em horas) das faixas usadas para os percentis de tempo.
+# A última faixa (índice len(FAIXAS_HORAS)) agrupa tudo o que ultrapassa o último limite.
+FAIXAS_HORAS = [1, 4, 8, 24, 48, 72, 120, 168, 336, 720]
+
+STATUS_ABERTOS = ('Pendente', 'Lido')
+
+# Dia juliano de 1970-01-01 00:00, para converter datas locais na mesma escala do julianday() do SQLite
+DIA_JULIANO_EPOCA = 2440587.5
+
+
+def dia_juliano_atual():
+    """Dia juliano da hora local atual, tal como julianday('now', 'localtime') no SQLite."""
+    return (datetime.now() - datetime(1970, 1, 1)).total_seconds() / 86400 + DIA_JULIANO_EPOCA
+
+
+def expressao_dia(registo):
+    """Expressão SQL do dia de registo ('AAAA-MM-DD'), a partir do campo 'data' (DD/MM/AAAA)."""
+    return f"(substr({registo}.data, 7, 4) || '-' || substr({registo}.data, 4, 2) || '-' || substr({registo}.data, 1, 2))"
+
+
+def expressao_faixa(horas):
+    """Expressão SQL que converte um número de horas no índice da sua faixa."""
+    casos = " ".join(f"WHEN {horas} <= {limite} THEN {i}" for i, limite in enumerate(FAIXAS_HORAS))
+    return f"CASE {casos} ELSE {len(FAIXAS_HORAS)} END"
+
+
+# Tempo até à leitura: primeira saída de 'Pendente'. Tempo até à resolução: primeira chegada a 'Resolvido'.
+# O histórico é gravado por último para que o NOT EXISTS só veja transições anteriores.
+CONDICAO_LEITURA = "OLD.status = 'Pendente' AND NOT EXISTS (SELECT 1 FROM historico_status WHERE demanda_id = NEW.id AND status_anterior = 'Pendente')"
+CONDICAO_RESOLUCAO = "NEW.status = 'Resolvido' AND NOT EXISTS (SELECT 1 FROM historico_status WHERE demanda_id = NEW.id AND status_novo = 'Resolvido')"
+
+# As instruções abaixo são o corpo dos triggers de 'demandas' nos dois backends; cada backend
+# fornece as expressões do seu dialeto para a hora atual e para o dia juliano de registo.
+
+
+def registar_historico(status_anterior, agora):
+    """Instrução de trigger que grava a passagem de 'status_anterior' para NEW.status no histórico."""
+    return f"""
+            INSERT INTO historico_status (demanda_id, status_anterior, status_novo, defensor, servidor, alterado_em)
+            VALUES (NEW.id, {status_anterior}, NEW.status, NEW.defensor, NEW.servidor, {agora});"""
+
+
+def contar_entrada():
+    """Instrução de trigger que soma a nova demanda à entrada diária."""
+    return f"""
+            INSERT INTO metricas_entrada_diaria (dia, defensor, servidor, total)
+            VALUES ({expressao_dia('NEW')}, NEW.defensor, NEW.servidor, 1)
+            ON CONFLICT (dia, defensor, servidor) DO UPDATE SET total = metricas_entrada_diaria.total + 1;"""
+
+
+def registar_tempo(metrica, condicao, horas):
+    """Instrução de trigger que soma 'horas' (expressão SQL) à faixa certa de uma métrica, se 'condicao' se verificar."""
+    return f"""
+            INSERT INTO metricas_tempo_status (metrica, defensor, servidor, faixa, total, soma_horas)
+            SELECT '{metrica}', NEW.defensor, NEW.servidor, {expressao_faixa(horas)}, 1, {horas}
+            WHERE {condicao}
+            ON CONFLICT (metrica, defensor, servidor, faixa) DO UPDATE SET
+                total = metricas_tempo_status.total + 1,
+                soma_horas = metricas_tempo_status.soma_horas + excluded.soma_horas;"""
+
+
+def mover_backlog(registo, sinal, criacao):
+    """
+    Instrução de trigger que soma (sinal=1) ou retira (sinal=-1) uma demanda do backlog.
+    'criacao' é a expressão SQL do dia juliano em que 'registo' foi criado.
+    """
+    return f"""
+            INSERT INTO metricas_backlog (defensor, servidor, status, total, soma_criacao)
+            VALUES ({registo}.defensor, {registo}.servidor, {registo}.status, {sinal}, {sinal} * {criacao})
+            ON CONFLICT (defensor, servidor, status) DO UPDATE SET
+                total = metricas_backlog.total + excluded.total,
+                soma_criacao = metricas_backlog.soma_criacao + excluded.soma_criacao;"""
+
+
+def criar_tabelas(cursor, chave_automatica):
+    """
+    Cria o histórico de status e as tabelas de indicadores, iguais nos dois backends.
+    'chave_automatica' é a declaração de uma coluna 'id' numerada automaticamente no dialeto do backend.
+    Os triggers que as mantêm são criados por cada backend.
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS historico_status (
+            id {chave_automatica},
+            demanda_id INTEGER NOT NULL,
+            status_anterior TEXT,
+            status_novo TEXT NOT NULL,
+            defensor TEXT,
+            servidor TEXT,
+            alterado_em TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historico_status_demanda ON historico_status (demanda_id, status_novo)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metricas_entrada_diaria (
+            dia TEXT NOT NULL,
+            defensor TEXT NOT NULL,
+            servidor TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (dia, defensor, servidor)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metricas_tempo_status (
+            metrica TEXT NOT NULL,
+            defensor TEXT NOT NULL,
+            servidor TEXT NOT NULL,
+            faixa INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            soma_horas DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (metrica, defensor, servidor, faixa)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metricas_backlog (
+            defensor TEXT NOT NULL,
+            servidor TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            soma_criacao DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (defensor, servidor, status)
+        )
+    """)
+
+
+def _percentil_faixas(contagens, p):
+    """Devolve o limite superior (em horas) da faixa onde cai o percentil p, ou None se passar do último limite."""
+    total = sum(contagens)
+    alvo = p / 100 * total
+    acumulado = 0
+    for faixa, quantidade in enumerate(contagens):
+        acumulado += quantidade
+        if acumulado >= alvo:
+            return FAIXAS_HORAS[faixa] if faixa < len(FAIXAS_HORAS) else None
+    return None
+
+
+def tempos_por_grupo(cursor, agrupar_por="defensor", percentis=(50, 90)):
+    """
+    Calcula, a partir das faixas acumuladas, os percentis dos tempos até à leitura
+    e até à resolução, por defensor ou por servidor. O custo não depende do tamanho do histórico.
+    """
+    if agrupar_por not in ("defensor", "servidor"):
+        raise ValueError("agrupar_por deve ser 'defensor' ou 'servidor'.")
+    cursor.execute(f"""
+        SELECT {agrupar_por}, metrica, faixa, SUM(total), SUM(soma_horas)
+        FROM metricas_tempo_status
+        GROUP BY 1, 2, 3
+    """)
+    grupos = {}
+    for grupo, metrica, faixa, total, soma_horas in cursor.fetchall():
+        dados = grupos.setdefault(grupo, {}).setdefault(metrica, {"faixas": [0] * (len(FAIXAS_HORAS) + 1), "soma": 0.0})
+        dados["faixas"][faixa] += total
+        dados["soma"] += soma_horas
+
+    linhas = []
+    for grupo, metricas in sorted(grupos.items()):
+        linha = {agrupar_por: grupo}
+        for metrica in ("leitura", "resolucao"):
+            dados = metricas.get(metrica)
+            total = sum(dados["faixas"]) if dados else 0
+            linha[f"{metrica}_total"] = total
+            linha[f"{metrica}_media_horas"] = round(dados["soma"] / total, 1) if total else None
+            for p in percentis:
+                linha[f"{metrica}_p{p}_horas"] = _percentil_faixas(dados["faixas"], p) if total else None
+        linhas.append(linha)
+    return linhas
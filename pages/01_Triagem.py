@@ -21,8 +21,8 @@ st.subheader("📊 Painel de Controle")
 
 # Carrega os dados para os gráficos
 try:
-    df_demandas_chart = db.consultar_demandas()
-    df_analises_chart = db.consultar_analises()
+    df_demandas_chart = db.snapshot_demandas()
+    df_analises_chart = db.snapshot_analises()
 
     if df_demandas_chart.empty and df_analises_chart.empty:
         st.info("Ainda não há dados suficientes para exibir os gráficos. Comece por registrar demandas ou análises.")
@@ -301,6 +301,7 @@ with tab_registrar:
         'Execução de Alimentos', 'Alimentos', 'Divórcio/RDU', 'Inventário',
         'Alvará', 'Curatela', 'Cível geral', 'Prazos geral'
     ]
+    LISTA_SETORES = ['CAR', 'CMC', 'NAP', 'Estagiário', 'Analista']
 
     if 'pinned_values' not in st.session_state: st.session_state.pinned_values = {"servidor": None}
     if 'pin_status' not in st.session_state: st.session_state.pin_status = {"servidor": False}
@@ -343,7 +344,7 @@ with tab_registrar:
         cpf_input = st.session_state.get('cpf', '')
         cpf_formatado = formatar_cpf(cpf_input)
         if len(cpf_formatado) == 11:
-            df = db.consultar_demandas()
+            df = db.snapshot_demandas()
             if not df.empty and 'cpf' in df.columns:
                 assistido = df[df['cpf'] == cpf_formatado]
                 if not assistido.empty:
@@ -392,6 +393,16 @@ with tab_registrar:
             with col_nome: st.text_input("Nome do Assistido", placeholder="Nome completo do assistido", key="nome_assistido")
             with col_cpf: st.text_input("CPF do Assistido", placeholder="000.000.000-00", key="cpf", on_change=buscar_nome_por_cpf, help="Digite o CPF e tecle Enter para buscar o nome.")
             with col_cod: st.text_input("Código de Referência", placeholder="Ex: 12345-67", key="codigo")
+
+            cpf_digitado = formatar_cpf(st.session_state.get('cpf', ''))
+            if len(cpf_digitado) == 11:
+                analise = db.consultar_ultima_analise(cpf_digitado)
+                if analise is None:
+                    st.caption("ℹ️ Nenhuma análise de hipossuficiência registada para este CPF.")
+                elif analise['resultado'] == 'Aprovado':
+                    st.success(f"Hipossuficiência: **{analise['resultado']}** em {analise['data_analise']} ({analise['motivo']}).")
+                else:
+                    st.error(f"Hipossuficiência: **{analise['resultado']}** em {analise['data_analise']} ({analise['motivo']}).")
             
             st.markdown("**Número do Processo(s)**")
             for i in range(st.session_state.num_processos):
@@ -413,6 +424,7 @@ with tab_registrar:
                     )
 
                 demanda = st.text_area("Descrição da Demanda", height=150, placeholder="Descreva a demanda...", key="demanda_desc")
+                setor_destino = st.selectbox("Encaminhar para (Opcional)", options=LISTA_SETORES, index=None, placeholder="Sem encaminhamento")
                 
                 submitted = st.form_submit_button("✔️ Guardar", use_container_width=True, type="primary")
 
@@ -428,7 +440,7 @@ with tab_registrar:
                             "cpf": formatar_cpf(st.session_state.cpf), "codigo": st.session_state.codigo, "demanda": demanda, 
                             "selecao_demanda": "; ".join(selecao_demanda_list), "status": 'Pendente', "data": datetime.now().strftime("%d/%m/%Y"), 
                             "horario": datetime.now().strftime("%H:%M:%S"), "numero_processo": ";".join(processos),
-                            "documento_gerado": ""
+                            "documento_gerado": "", "setor_destino": setor_destino
                         }
                         st.session_state.awaiting_confirmation = True
                         st.rerun()
@@ -440,7 +452,7 @@ with tab_consultar:
     if 'doc_generator_open_for' not in st.session_state: st.session_state.doc_generator_open_for = None
     if 'confirming_delete' not in st.session_state: st.session_state.confirming_delete = None
 
-    df_original = db.consultar_demandas()
+    df_original = db.snapshot_demandas()
 
     if st.session_state.doc_generator_open_for is not None:
         id_demanda = st.session_state.doc_generator_open_for
@@ -560,7 +572,7 @@ with tab_consultar:
         with col2: filtro_cpf = st.text_input("Buscar por CPF")
         with col3: filtro_defensor = st.selectbox("Filtrar por Defensor", options=["Todos"] + LISTA_DEFENSORES, key="consulta_defensor")
 
-        df_filtrado = df_original.copy()
+        df_filtrado = df_original
 
         if filtro_nome: df_filtrado = df_filtrado[df_filtrado['nome_assistido'].str.contains(filtro_nome, case=False, na=False)]
         if filtro_cpf: df_filtrado = df_filtrado[df_filtrado['cpf'].str.contains(formatar_cpf(filtro_cpf), case=False, na=False)]
@@ -595,7 +607,11 @@ with tab_consultar:
                 with col_expander:
                     status_color = "green" if row['status'] == 'Pendente' else 'orange'
                     doc_icon = "📄" if row.get('documento_gerado') else ""
-                    with st.expander(f"{doc_icon} **{row['nome_assistido']}** |  Data: {row['data']}  |  Status: :{status_color}[{row['status']}]"):
+                    analise_info = ""
+                    if row.get('resultado_analise') in ('Aprovado', 'Negado'):
+                        analise_color = "green" if row['resultado_analise'] == 'Aprovado' else 'red'
+                        analise_info = f"  |  Análise: :{analise_color}[{row['resultado_analise']}]"
+                    with st.expander(f"{doc_icon} **{row['nome_assistido']}** |  Data: {row['data']}  |  Status: :{status_color}[{row['status']}]{analise_info}"):
                         
                         with st.form(key=f"form_edit_{id_demanda}"):
                             st.subheader(f"Editando Registo ID: {id_demanda}")
@@ -611,7 +627,9 @@ with tab_consultar:
                                 dados_editados['defensor'] = st.selectbox("Defensor", options=LISTA_DEFENSORES, index=LISTA_DEFENSORES.index(row['defensor']) if row['defensor'] in LISTA_DEFENSORES else 0, key=f"defensor_{id_demanda}")
                                 dados_editados['status'] = st.selectbox("Status", options=['Pendente', 'Lido', 'Resolvido', 'Arquivado'], index=['Pendente', 'Lido', 'Resolvido', 'Arquivado'].index(row['status']) if row['status'] in ['Pendente', 'Lido', 'Resolvido', 'Arquivado'] else 0, key=f"status_{id_demanda}")
 
-                            dados_editados['numero_processo'] = st.text_input("Nº Processo", value=row.get('numero_processo', ''), help="Separar múltiplos com (;)", key=f"processo_{id_demanda}")
+                            setor_atual = row.get('setor_destino')
+                            dados_editados['setor_destino'] = st.selectbox("Encaminhado para", options=LISTA_SETORES, index=LISTA_SETORES.index(setor_atual) if setor_atual in LISTA_SETORES else None, placeholder="Sem encaminhamento", key=f"setor_{id_demanda}")
+                            dados_editados['numero_processo'] = st.text_input("Nº Processo", value=row.get('numero_processo', ''), help="Separar múltiplos com (;)", key=f"edit_processo_{id_demanda}")
                             dados_editados['demanda'] = st.text_area("Descrição da Demanda", value=row['demanda'], height=150, key=f"demanda_{id_demanda}")
                             dados_editados['documento_gerado'] = st.text_input("Documento Gerado", value=row.get('documento_gerado', ''), key=f"doc_gerado_{id_demanda}")
 
@@ -628,6 +646,22 @@ with tab_consultar:
                                 if st.form_submit_button("📄 Gerar/Enviar Solicitação", use_container_width=True):
                                     st.session_state.doc_generator_open_for = id_demanda
                                     st.rerun()
+
+                        # Consultado só quando pedido, para não fazer uma consulta por demanda a cada execução
+                        if st.toggle("🕓 Ver histórico de status", key=f"historico_{id_demanda}"):
+                            try:
+                                df_historico = db.consultar_historico_status(id_demanda)
+                                if df_historico.empty:
+                                    st.info("Sem mudanças de status registadas.")
+                                else:
+                                    st.dataframe(
+                                        df_historico[['alterado_em', 'status_anterior', 'status_novo', 'defensor', 'servidor']].rename(columns={
+                                            'alterado_em': 'Data', 'status_anterior': 'De', 'status_novo': 'Para',
+                                            'defensor': 'Defensor(a)', 'servidor': 'Servidor'
+                                        }),
+                                        use_container_width=True, hide_index=True
+                                    )
+                            except Exception as e: st.error(f"Ocorreu um erro ao consultar o histórico: {e}")
                 
                 with col_delete_btn:
                     st.write("") 
@@ -640,7 +674,7 @@ with tab_consultar_analises:
     st.subheader("📋 Consulta de Análises de Hipossuficiência Salvas")
     
     try:
-        df_analises = db.consultar_analises()
+        df_analises = db.snapshot_analises()
         
         if df_analises.empty:
             st.info("Nenhuma análise de hipossuficiência foi salva ainda.")
@@ -651,7 +685,7 @@ with tab_consultar_analises:
             with col2:
                 filtro_resultado = st.selectbox("Filtrar por Resultado", options=["Todos", "Aprovado", "Negado"], key="filtro_res_analise")
 
-            df_filtrado = df_analises.copy()
+            df_filtrado = df_analises
             if filtro_documento:
                 df_filtrado = df_filtrado[df_filtrado['documento'].str.contains(formatar_cpf(filtro_documento), na=False)]
             if filtro_resultado != "Todos":
@@ -661,6 +695,6 @@ with tab_consultar_analises:
 
     except Exception as e:
         st.error(f"Ocorreu um erro ao consultar as análises salvas: {e}")
-        st.warning("Verifique se a função `consultar_analises` existe e está configurada corretamente no seu ficheiro `database.py`.")
+        st.warning("Verifique se a função `snapshot_analises` existe e está configurada corretamente no seu ficheiro `database.py`.")
 
 #testee
\ No newline at end of file
@@ -0,0 +1,3 @@
+from caixa_entrada import exibir_caixa_entrada
+
+exibir_caixa_entrada("CMC")
@@ -0,0 +1,148 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+import database as db
+import backup
+import metricas
+
+# --- CONFIGURAÇÃO DA PÁGINA ---
+st.set_page_config(layout="wide", page_title="Coordenação")
+
+st.title("🗂️ Coordenação")
+st.divider()
+
+# --- INDICADORES DE ATENDIMENTO ---
+st.subheader("📈 Indicadores de Atendimento")
+st.caption("Indicadores mantidos incrementalmente a cada mudança de status; o tempo de carregamento não depende do tamanho do histórico.")
+
+def formatar_faixa(horas, total):
+    """Formata o limite superior de uma faixa de tempo para exibição."""
+    if not total:
+        return "—"
+    if horas is None or pd.isna(horas):
+        return f"> {metricas.FAIXAS_HORAS[-1]} h"
+    return f"≤ {int(horas)} h"
+
+try:
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("##### Entrada Diária (últimos 30 dias)")
+        df_entrada = db.consultar_entrada_diaria(30)
+        if df_entrada.empty:
+            st.info("Sem demandas registadas nos últimos 30 dias.")
+        else:
+            chart_entrada = alt.Chart(df_entrada).mark_bar().encode(
+                x=alt.X('dia:T', title="Dia"),
+                y=alt.Y('total:Q', title="Nº de Demandas"),
+                color=alt.Color('defensor:N', title="Defensor(a)"),
+                tooltip=['dia', 'defensor', 'total']
+            ).interactive()
+            st.altair_chart(chart_entrada, use_container_width=True)
+
+    with col2:
+        st.markdown("##### Backlog Atual")
+        df_backlog = db.consultar_backlog()
+        if df_backlog.empty:
+            st.info("Nenhuma demanda em aberto.")
+        else:
+            st.dataframe(
+                df_backlog.rename(columns={'defensor': 'Defensor(a)', 'status': 'Status', 'total': 'Em aberto', 'idade_media_dias': 'Idade média (dias)'}),
+                use_container_width=True, hide_index=True
+            )
+
+    st.markdown("##### Tempos de Atendimento")
+    agrupar_por = st.radio("Agrupar por", ['defensor', 'servidor'], horizontal=True, format_func=str.capitalize, key="metricas_agrupar")
+    df_tempos = db.consultar_tempos_atendimento(agrupar_por)
+    if df_tempos.empty:
+        st.info("Ainda não há mudanças de status registadas.")
+    else:
+        df_exibicao = pd.DataFrame({
+            agrupar_por.capitalize(): df_tempos[agrupar_por],
+            "Lidas": df_tempos['leitura_total'],
+            "Leitura p50": [formatar_faixa(h, t) for h, t in zip(df_tempos['leitura_p50_horas'], df_tempos['leitura_total'])],
+            "Leitura p90": [formatar_faixa(h, t) for h, t in zip(df_tempos['leitura_p90_horas'], df_tempos['leitura_total'])],
+            "Leitura média (h)": df_tempos['leitura_media_horas'],
+            "Resolvidas": df_tempos['resolucao_total'],
+            "Resolução p50": [formatar_faixa(h, t) for h, t in zip(df_tempos['resolucao_p50_horas'], df_tempos['resolucao_total'])],
+            "Resolução p90": [formatar_faixa(h, t) for h, t in zip(df_tempos['resolucao_p90_horas'], df_tempos['resolucao_total'])],
+            "Resolução média (h)": df_tempos['resolucao_media_horas'],
+        })
+        st.dataframe(df_exibicao, use_container_width=True, hide_index=True)
+
+except Exception as e:
+    st.error(f"Ocorreu um erro ao carregar os indicadores: {e}")
+
+st.divider()
+
+# --- REVISÃO DE ASSISTIDOS DUPLICADOS ---
+st.subheader("👥 Assistidos Possivelmente Duplicados")
+st.markdown("Pares de registos com nomes semelhantes ou o mesmo CPF. Escolha qual registo manter para unificar o nome e o CPF, ou marque como pessoas diferentes.")
+
+if st.button("🔄 Reprocessar todas as demandas", help="Recria o índice de duplicados a partir de toda a base de dados."):
+    try:
+        total = db.detectar_duplicados()
+        st.toast(f"{total} candidato(s) encontrado(s).", icon="🔍")
+    except Exception as e: st.error(f"Ocorreu um erro ao procurar duplicados: {e}")
+
+try:
+    df_candidatos = db.consultar_candidatos_mesclagem()
+
+    if df_candidatos.empty:
+        st.info("Nenhum assistido duplicado pendente de revisão.")
+    else:
+        st.info(f"{len(df_candidatos)} par(es) pendente(s) de revisão.")
+
+        for index, row in df_candidatos.iterrows():
+            id_candidato = row['id']
+            with st.container(border=True):
+                st.caption(f"Similaridade: {row['similaridade']:.0%}  |  {row['motivo']}  |  Detetado em {row['detectado_em']}")
+                col_a, col_b, col_acoes = st.columns([2, 2, 1])
+                with col_a:
+                    st.markdown(f"**A:** {row['nome_a']}  \nCPF: {row['cpf_a'] or '—'}  \nDemanda ID: {row['demanda_a']}")
+                with col_b:
+                    st.markdown(f"**B:** {row['nome_b']}  \nCPF: {row['cpf_b'] or '—'}  \nDemanda ID: {row['demanda_b']}")
+                with col_acoes:
+                    for lado in ('a', 'b'):
+                        if st.button(f"Manter {lado.upper()}", key=f"manter_{lado}_{id_candidato}", use_container_width=True):
+                            alterados = db.mesclar_assistidos(id_candidato, manter=lado)
+                            if alterados:
+                                st.toast(f"Registos unificados! {len(alterados)} demanda(s) atualizada(s).", icon="✅")
+                            else:
+                                st.toast("Nenhum registo foi alterado: a demanda do par já não existe. Reprocesse as demandas.", icon="⚠️")
+                            st.rerun()
+                    if st.button("Pessoas diferentes", key=f"rejeitar_{id_candidato}", use_container_width=True):
+                        db.rejeitar_candidato_mesclagem(id_candidato)
+                        st.rerun()
+
+except Exception as e:
+    st.error(f"Ocorreu um erro ao consultar os duplicados: {e}")
+
+st.divider()
+
+# --- CÓPIAS DE SEGURANÇA ---
+st.subheader("💾 Cópias de Segurança")
+if db.BACKEND != 'sqlite':
+    st.info("As cópias de segurança automáticas só se aplicam ao backend SQLite. No PostgreSQL, use as ferramentas do servidor (ex.: pg_dump).")
+else:
+    st.caption(f"Cópias automáticas a cada {backup.INTERVALO_HORAS:g} hora(s); são mantidas as {backup.MAXIMO_BACKUPS} mais recentes.")
+
+    if st.button("Criar cópia agora"):
+        try:
+            relatorio = backup.criar_backup(db.DB_NAME)
+            st.toast(f"Cópia criada em {relatorio['segundos_total']:.2f}s.", icon="💾")
+        except Exception as e: st.error(f"Ocorreu um erro ao criar a cópia: {e}")
+
+    backups = backup.listar_backups()
+    if not backups:
+        st.info("Ainda não existe nenhuma cópia de segurança.")
+    else:
+        df_backups = pd.DataFrame([{
+            "Arquivo": b["arquivo"], "Criado em": b.get("criado_em"), "Íntegro": b.get("integro"),
+            "Demandas": b.get("contagens", {}).get("demandas"),
+            "Tamanho (KB)": round(b.get("tamanho_comprimido", 0) / 1024, 1),
+            "Cópia (s)": b.get("segundos_copia"), "Verificação (s)": b.get("segundos_verificacao"),
+            "Compressão (s)": b.get("segundos_compressao"), "Total (s)": b.get("segundos_total"),
+        } for b in backups])
+        st.dataframe(df_backups, use_container_width=True, hide_index=True)
+        st.caption("Para restaurar, pare a aplicação e execute: `python backup.py restaurar <arquivo>`")
@@ -0,0 +1,285 @@
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+import pandas as pd
+import deduplicacao
+import metricas
+
+BACKENDS = ('sqlite', 'postgres')
+
+# Colunas acrescentadas à tabela 'demandas' depois da sua criação, criadas quando faltam
+COLUNAS_ADICIONAIS_DEMANDAS = {
+    'numero_processo': 'TEXT', 'cpf': 'TEXT', 'documento_gerado': 'TEXT',
+    'crc_tipo_certidao': 'TEXT', 'crc_nome_registrado': 'TEXT',
+    'crc_data_nascimento': 'TEXT', 'crc_local_nascimento': 'TEXT',
+    'crc_nome_pai': 'TEXT', 'crc_nome_mae': 'TEXT',
+    'crc_nome_conjuge2': 'TEXT', 'crc_data_casamento': 'TEXT',
+    'crc_local_casamento': 'TEXT', 'crc_data_obito': 'TEXT',
+    'crc_local_obito': 'TEXT', 'crc_filiacao_obito': 'TEXT',
+    'crc_cartorio': 'TEXT', 'crc_finalidade': 'TEXT',
+    'crc_status': 'TEXT', 'setor_destino': 'TEXT', 'atualizado_em': 'TEXT'
+}
+
+# Tempo durante o qual as remoções de demandas ficam registadas para as caixas de entrada
+RETENCAO_REMOCOES = timedelta(days=30)
+
+# Tabelas copiadas na migração do SQLite para o PostgreSQL, por ordem
+TABELAS = [
+    'demandas', 'analises_hipossuficiencia', 'ultima_analise', 'historico_status',
+    'metricas_entrada_diaria', 'metricas_tempo_status', 'metricas_backlog',
+    'chaves_assistido', 'candidatos_mesclagem', 'demandas_removidas',
+]
+
+
+def criar_repositorio(backend, caminho=None, dsn=None):
+    """
+    Cria o repositório do backend configurado ('sqlite' ou 'postgres').
+    O módulo do PostgreSQL só é importado quando é usado, para que o psycopg seja opcional.
+    """
+    if backend == 'sqlite':
+        from repositorio_sqlite import RepositorioSQLite
+        return RepositorioSQLite(caminho)
+    if backend == 'postgres':
+        from repositorio_postgres import RepositorioPostgres
+        return RepositorioPostgres(dsn)
+    raise ValueError(f"Backend de armazenamento desconhecido: '{backend}'. Use um de {BACKENDS}.")
+
+
+def _dataframe(cursor, query, parametros=()):
+    cursor.execute(query, tuple(parametros))
+    colunas = [d[0] for d in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=colunas)
+
+
+class RepositorioDemandas(ABC):
+    """
+    Operações de armazenamento usadas pela aplicação, independentes do backend.
+    As consultas usam '?' como marcador de parâmetros; cada backend fornece um cursor
+    que as aceita, a forma de inserir devolvendo o ID e o que for específico do motor.
+    """
+
+    # Janela extra relida pelas caixas de entrada, para apanhar transações que gravaram
+    # um carimbo 'atualizado_em' anterior mas só ficaram visíveis depois
+    MARGEM_CAIXA_ENTRADA = timedelta(0)
+
+    # Declaração de uma coluna 'id' numerada automaticamente, no dialeto do backend
+    CHAVE_AUTOMATICA = None
+
+    # --- Operações específicas de cada backend ---
+
+    @abstractmethod
+    def inicializar(self):
+        """Cria ou atualiza o esquema da base de dados."""
+
+    @abstractmethod
+    def _transacao(self):
+        """Gestor de contexto que fornece um cursor com marcadores '?' e confirma a transação no fim."""
+
+    @abstractmethod
+    def _inserir(self, cursor, tabela, dados):
+        """Insere uma linha e retorna o seu ID."""
+
+    @abstractmethod
+    def versao_dados(self):
+        """Retorna um número que muda sempre que alguém grava nas tabelas de demandas ou análises."""
+
+    @abstractmethod
+    def _tabela_existe(self, cursor, tabela):
+        """Indica se a tabela já existe na base de dados."""
+
+    # --- Esquema comum aos backends ---
+    # Só os triggers e a numeração automática dos IDs mudam de um backend para o outro
+
+    def _criar_tabela_remocoes(self, cursor):
+        """Cria o registo das demandas apagadas, para que as caixas de entrada as possam retirar."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS demandas_removidas (
+                demanda_id INTEGER NOT NULL,
+                removido_em TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_demandas_removidas_em ON demandas_removidas (removido_em)")
+        self._limpar_remocoes_antigas(cursor)
+
+    def _criar_tabela_ultima_analise(self, cursor):
+        """
+        Cria a tabela com a análise mais recente de cada documento e os índices da junção com as demandas.
+        Devolve True se a tabela acabou de ser criada e ainda precisa de ser preenchida.
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_analises_documento ON analises_hipossuficiencia (documento, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_demandas_cpf ON demandas (cpf)")
+        nova = not self._tabela_existe(cursor, 'ultima_analise')
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ultima_analise (
+                documento TEXT PRIMARY KEY,
+                analise_id INTEGER NOT NULL,
+                resultado TEXT,
+                motivo TEXT,
+                data_analise TEXT
+            )
+        """)
+        return nova
+
+    def _consulta_grande(self, query):
+        """Executa uma consulta que pode devolver muitas linhas e retorna um DataFrame."""
+        with self._transacao() as cursor:
+            return _dataframe(cursor, query)
+
+    # --- Demandas ---
+
+    def adicionar_demanda(self, **kwargs):
+        with self._transacao() as cursor:
+            demanda_id = self._inserir(cursor, 'demandas', kwargs)
+            deduplicacao.indexar_demanda(cursor, demanda_id, kwargs.get('nome_assistido'), kwargs.get('cpf'))
+        return demanda_id
+
+    def consultar_demandas(self):
+        with self._transacao() as cursor:
+            return _dataframe(cursor, "SELECT * FROM demandas ORDER BY id DESC")
+
+    def atualizar_demanda(self, demanda_id, novos_dados):
+        set_clause = ', '.join([f"{key} = ?" for key in novos_dados.keys()])
+        values = list(novos_dados.values()) + [demanda_id]
+        with self._transacao() as cursor:
+            cursor.execute(f"UPDATE demandas SET {set_clause} WHERE id = ?", tuple(values))
+            if 'nome_assistido' in novos_dados or 'cpf' in novos_dados:
+                cursor.execute("SELECT nome_assistido, cpf FROM demandas WHERE id = ?", (demanda_id,))
+                registo = cursor.fetchone()
+                if registo:
+                    deduplicacao.indexar_demanda(cursor, demanda_id, *registo)
+
+    def deletar_demanda(self, demanda_id):
+        with self._transacao() as cursor:
+            cursor.execute("DELETE FROM demandas WHERE id = ?", (demanda_id,))
+            deduplicacao.remover_demanda(cursor, demanda_id)
+
+    # --- Análises de hipossuficiência ---
+
+    def adicionar_analise(self, **kwargs):
+        with self._transacao() as cursor:
+            return self._inserir(cursor, 'analises_hipossuficiencia', kwargs)
+
+    def consultar_analises(self):
+        with self._transacao() as cursor:
+            return _dataframe(cursor, "SELECT * FROM analises_hipossuficiencia ORDER BY id DESC")
+
+    def consultar_ultima_analise(self, documento):
+        with self._transacao() as cursor:
+            cursor.execute(
+                "SELECT resultado, motivo, data_analise FROM ultima_analise WHERE documento = ?", (documento,)
+            )
+            registo = cursor.fetchone()
+        if registo is None:
+            return None
+        return dict(zip(('resultado', 'motivo', 'data_analise'), registo))
+
+    # --- Caixas de entrada e cópia partilhada ---
+
+    def _desde_com_margem(self, desde):
+        if not self.MARGEM_CAIXA_ENTRADA:
+            return desde
+        inicio = datetime.strptime(desde, "%Y-%m-%d %H:%M:%S.%f") - self.MARGEM_CAIXA_ENTRADA
+        return inicio.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    def consultar_caixa_entrada(self, setor, desde=None):
+        colunas = "id, nome_assistido, cpf, defensor, servidor, setor_destino, demanda, status, data, horario, atualizado_em"
+        if desde:
+            # Sem filtro de setor, para que quem consulta veja também as demandas que saíram do seu setor
+            query = f"SELECT {colunas} FROM demandas WHERE atualizado_em >= ? ORDER BY atualizado_em"
+            parametros = (self._desde_com_margem(desde),)
+        else:
+            placeholders = ', '.join(['?'] * len(metricas.STATUS_ABERTOS))
+            query = f"""
+                SELECT {colunas} FROM demandas
+                WHERE setor_destino = ? AND status IN ({placeholders})
+                ORDER BY atualizado_em
+            """
+            parametros = (setor, *metricas.STATUS_ABERTOS)
+        with self._transacao() as cursor:
+            return _dataframe(cursor, query, parametros)
+
+    def _limpar_remocoes_antigas(self, cursor):
+        """Apaga os registos de demandas removidas há mais de RETENCAO_REMOCOES."""
+        limite = (datetime.now() - RETENCAO_REMOCOES).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        cursor.execute("DELETE FROM demandas_removidas WHERE removido_em < ?", (limite,))
+
+    def consultar_demandas_removidas(self, desde):
+        with self._transacao() as cursor:
+            cursor.execute(
+                "SELECT demanda_id FROM demandas_removidas WHERE removido_em >= ?", (self._desde_com_margem(desde),)
+            )
+            return [linha[0] for linha in cursor.fetchall()]
+
+    def ler_snapshot(self):
+        """Lê as tabelas usadas pela cópia partilhada em memória: (demandas com a última análise, análises)."""
+        df_demandas = self._consulta_grande("""
+            SELECT d.*, u.resultado AS resultado_analise, u.data_analise AS data_ultima_analise
+            FROM demandas d
+            LEFT JOIN ultima_analise u ON u.documento = d.cpf
+            ORDER BY d.id DESC
+        """)
+        df_analises = self._consulta_grande("SELECT * FROM analises_hipossuficiencia ORDER BY id DESC")
+        return df_demandas, df_analises
+
+    # --- Deduplicação de assistidos ---
+
+    def detectar_duplicados(self):
+        with self._transacao() as cursor:
+            return deduplicacao.reconstruir_indice(cursor)
+
+    def consultar_candidatos_mesclagem(self, status='Pendente'):
+        with self._transacao() as cursor:
+            return _dataframe(cursor, """
+                SELECT c.id, c.similaridade, c.motivo, c.status, c.detectado_em,
+                       c.demanda_a, a.nome_assistido AS nome_a, a.cpf AS cpf_a,
+                       c.demanda_b, b.nome_assistido AS nome_b, b.cpf AS cpf_b
+                FROM candidatos_mesclagem c
+                LEFT JOIN demandas a ON a.id = c.demanda_a
+                LEFT JOIN demandas b ON b.id = c.demanda_b
+                WHERE c.status = ?
+                ORDER BY c.similaridade DESC, c.id
+            """, (status,))
+
+    def mesclar_assistidos(self, candidato_id, manter='a'):
+        with self._transacao() as cursor:
+            return deduplicacao.mesclar(cursor, candidato_id, manter)
+
+    def rejeitar_candidato_mesclagem(self, candidato_id):
+        with self._transacao() as cursor:
+            cursor.execute("UPDATE candidatos_mesclagem SET status = 'Rejeitado' WHERE id = ?", (candidato_id,))
+
+    # --- Indicadores ---
+
+    def consultar_historico_status(self, demanda_id):
+        with self._transacao() as cursor:
+            return _dataframe(cursor, "SELECT * FROM historico_status WHERE demanda_id = ? ORDER BY id", (demanda_id,))
+
+    def consultar_entrada_diaria(self, dias=30):
+        inicio = (date.today() - timedelta(days=dias)).isoformat()
+        with self._transacao() as cursor:
+            return _dataframe(cursor, """
+                SELECT dia, defensor, SUM(total) AS total
+                FROM metricas_entrada_diaria
+                WHERE dia >= ?
+                GROUP BY dia, defensor
+                ORDER BY dia
+            """, (inicio,))
+
+    def consultar_tempos_atendimento(self, agrupar_por='defensor'):
+        with self._transacao() as cursor:
+            return pd.DataFrame(metricas.tempos_por_grupo(cursor, agrupar_por))
+
+    def consultar_backlog(self):
+        with self._transacao() as cursor:
+            placeholders = ', '.join(['?'] * len(metricas.STATUS_ABERTOS))
+            df = _dataframe(cursor, f"""
+                SELECT defensor, status, SUM(total) AS total, SUM(soma_criacao) AS soma_criacao
+                FROM metricas_backlog
+                WHERE status IN ({placeholders})
+                GROUP BY defensor, status
+                HAVING SUM(total) > 0
+                ORDER BY defensor, status
+            """, metricas.STATUS_ABERTOS)
+        # Sem linhas (ou com os Decimal do PostgreSQL) as colunas vêm como 'object', que não arredonda
+        media_criacao = df['soma_criacao'].astype(float) / df['total'].astype(float)
+        df['idade_media_dias'] = (metricas.dia_juliano_atual() - media_criacao).round(1)
+        return df.drop(columns='soma_criacao')
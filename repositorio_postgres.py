@@ -0,0 +1,373 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+import psycopg
+from psycopg_pool import ConnectionPool
+import deduplicacao
+import metricas
+from repositorio import COLUNAS_ADICIONAIS_DEMANDAS, RepositorioDemandas
+
+# Número máximo de conexões abertas pelo processo (partilhadas por todas as sessões)
+TAMANHO_POOL = int(os.environ.get("DEMANDAS_POSTGRES_POOL", "10"))
+
+# Linhas trazidas de cada vez pelos cursores do lado do servidor
+TAMANHO_LOTE = 5000
+
+# Mesmo formato do strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') usado no SQLite.
+# O clock_timestamp() segue o TimeZone da sessão, fixado no fuso da aplicação em cada conexão.
+AGORA = "to_char(clock_timestamp(), 'YYYY-MM-DD HH24:MI:SS.MS')"
+
+# Canal do NOTIFY enviado no commit de cada escrita em demandas ou análises
+CANAL_VERSAO = "demandas_versao"
+
+# Segundos de espera antes de reabrir a conexão que escuta o canal, se ela cair
+ESPERA_RECONEXAO = 5
+
+
+def _fuso_horario():
+    """
+    Fuso horário da aplicação, no formato aceite pelo TimeZone do PostgreSQL.
+    Usa DEMANDAS_FUSO_HORARIO (ex.: 'America/Sao_Paulo') ou, sem ela, o desvio local atual
+    em notação POSIX, onde o sinal é invertido: UTC-03:00 fica '<-0300>+03:00'.
+    """
+    fuso = os.environ.get("DEMANDAS_FUSO_HORARIO")
+    if fuso:
+        return fuso
+    segundos = int(datetime.now().astimezone().utcoffset().total_seconds())
+    horas, minutos = divmod(abs(segundos) // 60, 60)
+    a_leste = segundos >= 0
+    return f"<{'+' if a_leste else '-'}{horas:02d}{minutos:02d}>{'-' if a_leste else '+'}{horas:02d}:{minutos:02d}"
+
+
+class _CursorQmark:
+    """Cursor do psycopg que aceita consultas com '?' como marcador, tal como o sqlite3."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        # Indica se alguma instrução pode ter alterado dados (tudo o que não é SELECT)
+        self.escreveu = False
+
+    def _registar_escrita(self):
+        if not (self._cursor.statusmessage or '').startswith('SELECT'):
+            self.escreveu = True
+
+    @staticmethod
+    def _converter(query):
+        return query.replace('%', '%%').replace('?', '%s')
+
+    def execute(self, query, parametros=None):
+        if parametros is not None:
+            query = self._converter(query)
+        self._cursor.execute(query, parametros)
+        self._registar_escrita()
+        return self
+
+    def executemany(self, query, sequencia):
+        self._cursor.executemany(self._converter(query), sequencia)
+        self._registar_escrita()
+        return self
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+
+def _dia_juliano_registo(registo):
+    """Expressão SQL (dia juliano) do momento de registo, com a função dia_juliano_registo criada em inicializar()."""
+    return f"dia_juliano_registo({registo}.data, {registo}.horario)"
+
+
+class RepositorioPostgres(RepositorioDemandas):
+    """
+    Armazenamento num servidor PostgreSQL, partilhado por vários processos da aplicação.
+    As conexões vêm de um pool; as leituras grandes usam cursores do lado do servidor
+    e as cargas em lote usam COPY.
+    """
+
+    # Um carimbo é gravado durante a transação mas só fica visível no commit
+    MARGEM_CAIXA_ENTRADA = timedelta(seconds=5)
+
+    CHAVE_AUTOMATICA = "INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+
+    def __init__(self, dsn):
+        if not dsn:
+            raise ValueError("Defina DEMANDAS_POSTGRES_DSN para usar o backend 'postgres'.")
+        self._dsn = dsn
+        # Os carimbos gravados pelos triggers ficam na hora local da aplicação, como no SQLite
+        self._opcoes_conexao = {"options": f"-c TimeZone={_fuso_horario()}"}
+        self._pool = ConnectionPool(dsn, min_size=1, max_size=TAMANHO_POOL, open=True, name="demandas",
+                                    kwargs=self._opcoes_conexao)
+        # Contador local da versão dos dados, incrementado pela thread que escuta o canal
+        self._versao = 0
+        self._trava_versao = threading.Lock()
+        self._escuta = None
+
+    @contextmanager
+    def _transacao(self):
+        # O pool confirma a transação ao devolver a conexão, ou desfaz-a se houver exceção
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor_qmark = _CursorQmark(cursor)
+                yield cursor_qmark
+        # Transação confirmada: quem escreveu vê logo a alteração, sem esperar pelo NOTIFY
+        if cursor_qmark.escreveu:
+            self._incrementar_versao()
+
+    def _inserir(self, cursor, tabela, dados):
+        cols = ', '.join(dados.keys())
+        placeholders = ', '.join(['?'] * len(dados))
+        cursor.execute(f"INSERT INTO {tabela} ({cols}) VALUES ({placeholders}) RETURNING id", tuple(dados.values()))
+        return cursor.fetchone()[0]
+
+    def versao_dados(self):
+        with self._trava_versao:
+            if self._escuta is None:
+                self._escuta = threading.Thread(target=self._escutar_versao, name="demandas-versao", daemon=True)
+                self._escuta.start()
+            return self._versao
+
+    def _incrementar_versao(self):
+        with self._trava_versao:
+            self._versao += 1
+
+    def _escutar_versao(self):
+        """
+        Escuta o canal de versão numa conexão própria e incrementa o contador a cada notificação.
+        O PostgreSQL só entrega o NOTIFY quando a transação que o enviou é confirmada.
+        """
+        while True:
+            try:
+                with psycopg.connect(self._dsn, autocommit=True, **self._opcoes_conexao) as conn:
+                    conn.execute(f"LISTEN {CANAL_VERSAO}")
+                    # Notificações enviadas antes do LISTEN (ou enquanto a conexão esteve em baixo) perderam-se
+                    self._incrementar_versao()
+                    for _ in conn.notifies():
+                        self._incrementar_versao()
+            except psycopg.Error:
+                pass
+            time.sleep(ESPERA_RECONEXAO)
+
+    def _tabela_existe(self, cursor, tabela):
+        cursor.execute("SELECT to_regclass(?) IS NOT NULL", (tabela,))
+        return cursor.fetchone()[0]
+
+    def _consulta_grande(self, query):
+        """Lê o resultado em lotes com um cursor do lado do servidor, sem o trazer todo de uma vez."""
+        with self._pool.connection() as conn:
+            with conn.cursor(name="consulta_grande") as cursor:
+                cursor.execute(query)
+                colunas = [d[0] for d in cursor.description]
+                partes = []
+                while linhas := cursor.fetchmany(TAMANHO_LOTE):
+                    partes.append(pd.DataFrame(linhas, columns=colunas))
+        if not partes:
+            return pd.DataFrame(columns=colunas)
+        return pd.concat(partes, ignore_index=True)
+
+    def contar_linhas(self, tabela):
+        with self._transacao() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+            return cursor.fetchone()[0]
+
+    def carregar_em_lote(self, tabela, colunas, linhas, substituir=False):
+        """
+        Copia linhas para uma tabela com COPY, tal como estão: os triggers da tabela ficam
+        desligados durante a carga, para que métricas e carimbos venham da origem.
+        Com 'substituir', a tabela é esvaziada antes. Retorna o número de linhas copiadas.
+        """
+        total = 0
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                if substituir:
+                    cursor.execute(f"TRUNCATE {tabela}")
+                cursor.execute(f"ALTER TABLE {tabela} DISABLE TRIGGER USER")
+                with cursor.copy(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN") as copia:
+                    for linha in linhas:
+                        copia.write_row(linha)
+                        total += 1
+                cursor.execute(f"ALTER TABLE {tabela} ENABLE TRIGGER USER")
+                if 'id' in colunas:
+                    # Os IDs vieram da origem: a próxima inserção continua a partir do maior
+                    cursor.execute(
+                        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {tabela}), 0) + 1, false)",
+                        (tabela,)
+                    )
+                cursor.execute("SELECT pg_notify(%s, '')", (CANAL_VERSAO,))
+        self._incrementar_versao()
+        return total
+
+    def inicializar(self):
+        """
+        Cria as tabelas, índices e triggers se não existirem, com o mesmo esquema do SQLite.
+        As tabelas começam vazias; os dados existentes vêm de migrar_para_postgres.py.
+        """
+        with self._transacao() as cursor:
+            # Vários processos podem arrancar ao mesmo tempo
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('demandas_esquema'))")
+
+            # --- Tabela de Demandas ---
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS demandas (
+                    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    servidor TEXT NOT NULL,
+                    defensor TEXT NOT NULL,
+                    nome_assistido TEXT NOT NULL,
+                    cpf TEXT,
+                    codigo TEXT NOT NULL,
+                    demanda TEXT NOT NULL,
+                    selecao_demanda TEXT,
+                    status TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    horario TEXT NOT NULL
+                )
+            """)
+            for col, tipo in COLUNAS_ADICIONAIS_DEMANDAS.items():
+                cursor.execute(f"ALTER TABLE demandas ADD COLUMN IF NOT EXISTS {col} {tipo}")
+
+            # --- Carimbo de atualização para as caixas de entrada ---
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION demandas_carimbo() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' AND NEW.atualizado_em IS NULL
+                       OR TG_OP = 'UPDATE' AND NEW.atualizado_em IS NOT DISTINCT FROM OLD.atualizado_em THEN
+                        NEW.atualizado_em := {AGORA};
+                    END IF;
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute("DROP TRIGGER IF EXISTS demandas_carimbo ON demandas")
+            cursor.execute("""
+                CREATE TRIGGER demandas_carimbo BEFORE INSERT OR UPDATE ON demandas
+                FOR EACH ROW EXECUTE FUNCTION demandas_carimbo()
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_demandas_atualizado_em ON demandas (atualizado_em)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_demandas_setor_atualizado ON demandas (setor_destino, atualizado_em)")
+            self._criar_tabela_remocoes(cursor)
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION demandas_registo_remocao() RETURNS trigger AS $$
+                BEGIN
+                    INSERT INTO demandas_removidas (demanda_id, removido_em) VALUES (OLD.id, {AGORA});
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute("DROP TRIGGER IF EXISTS demandas_registo_remocao ON demandas")
+            cursor.execute("""
+                CREATE TRIGGER demandas_registo_remocao AFTER DELETE ON demandas
+                FOR EACH ROW EXECUTE FUNCTION demandas_registo_remocao()
+            """)
+
+            # --- Tabela de Análises de Hipossuficiência ---
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS analises_hipossuficiencia (
+                    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    tipo_pessoa TEXT,
+                    documento TEXT NOT NULL,
+                    vulnerabilidades TEXT,
+                    detalhes TEXT,
+                    resultado TEXT,
+                    motivo TEXT,
+                    data_analise TEXT
+                )
+            """)
+
+            # --- Última análise por documento ---
+            self._criar_tabela_ultima_analise(cursor)
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION analises_ultima() RETURNS trigger AS $$
+                BEGIN
+                    INSERT INTO ultima_analise (documento, analise_id, resultado, motivo, data_analise)
+                    VALUES (NEW.documento, NEW.id, NEW.resultado, NEW.motivo, NEW.data_analise)
+                    ON CONFLICT (documento) DO UPDATE SET
+                        analise_id = excluded.analise_id,
+                        resultado = excluded.resultado,
+                        motivo = excluded.motivo,
+                        data_analise = excluded.data_analise
+                    WHERE excluded.analise_id > ultima_analise.analise_id;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute("DROP TRIGGER IF EXISTS analises_ultima_insercao ON analises_hipossuficiencia")
+            cursor.execute("""
+                CREATE TRIGGER analises_ultima_insercao AFTER INSERT ON analises_hipossuficiencia
+                FOR EACH ROW EXECUTE FUNCTION analises_ultima()
+            """)
+
+            # --- Histórico de status e indicadores ---
+            metricas.criar_tabelas(cursor, self.CHAVE_AUTOMATICA)
+
+            # Dia juliano na mesma escala do julianday() do SQLite, a partir dos campos 'data' e 'horario'
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION dia_juliano(momento TIMESTAMP) RETURNS DOUBLE PRECISION AS $$
+                    SELECT EXTRACT(EPOCH FROM momento)::DOUBLE PRECISION / 86400 + {metricas.DIA_JULIANO_EPOCA}
+                $$ LANGUAGE sql IMMUTABLE
+            """)
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION dia_juliano_registo(data TEXT, horario TEXT) RETURNS DOUBLE PRECISION AS $$
+                    SELECT dia_juliano(to_timestamp(data || ' ' || horario, 'DD/MM/YYYY HH24:MI:SS')::TIMESTAMP)
+                $$ LANGUAGE sql STABLE
+            """)
+
+            # Os mesmos triggers do SQLite, reunidos numa só função PL/pgSQL
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION metricas_demandas() RETURNS trigger AS $$
+                DECLARE
+                    horas DOUBLE PRECISION;
+                BEGIN
+                    IF TG_OP = 'INSERT' THEN
+                        {metricas.registar_historico('NULL', AGORA)}
+                        {metricas.contar_entrada()}
+                        {metricas.mover_backlog('NEW', 1, _dia_juliano_registo('NEW'))}
+                    ELSIF TG_OP = 'UPDATE' THEN
+                        IF OLD.status IS DISTINCT FROM NEW.status THEN
+                            horas := (dia_juliano(clock_timestamp()::TIMESTAMP) - {_dia_juliano_registo('NEW')}) * 24;
+                            {metricas.registar_tempo('leitura', metricas.CONDICAO_LEITURA, 'horas')}
+                            {metricas.registar_tempo('resolucao', metricas.CONDICAO_RESOLUCAO, 'horas')}
+                            {metricas.registar_historico('OLD.status', AGORA)}
+                        END IF;
+                        IF OLD.status IS DISTINCT FROM NEW.status OR OLD.defensor IS DISTINCT FROM NEW.defensor
+                           OR OLD.servidor IS DISTINCT FROM NEW.servidor THEN
+                            {metricas.mover_backlog('OLD', -1, _dia_juliano_registo('OLD'))}
+                            {metricas.mover_backlog('NEW', 1, _dia_juliano_registo('NEW'))}
+                        END IF;
+                    ELSE
+                        {metricas.mover_backlog('OLD', -1, _dia_juliano_registo('OLD'))}
+                    END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute("DROP TRIGGER IF EXISTS metricas_demandas ON demandas")
+            cursor.execute("""
+                CREATE TRIGGER metricas_demandas AFTER INSERT OR UPDATE OR DELETE ON demandas
+                FOR EACH ROW EXECUTE FUNCTION metricas_demandas()
+            """)
+
+            # --- Índice de assistidos duplicados ---
+            indice_novo = not self._tabela_existe(cursor, 'chaves_assistido')
+            deduplicacao.criar_tabelas(cursor, self.CHAVE_AUTOMATICA)
+            if indice_novo:
+                deduplicacao.reconstruir_indice(cursor)
+
+            # --- Versão dos dados ---
+            # Substitui o 'PRAGMA data_version' do SQLite: cada escrita em demandas ou análises envia um
+            # NOTIFY, entregue no commit, que incrementa o contador local de versao_dados() em cada processo.
+            # Ao contrário de uma linha de contador, não obriga as transações a esperarem umas pelas outras.
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION versao_dados_notificar() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('{CANAL_VERSAO}', '');
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            for tabela in ('demandas', 'analises_hipossuficiencia'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS versao_dados ON {tabela}")
+                cursor.execute(f"""
+                    CREATE TRIGGER versao_dados AFTER INSERT OR UPDATE OR DELETE ON {tabela}
+                    FOR EACH STATEMENT EXECUTE FUNCTION versao_dados_notificar()
+                """)
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+import deduplicacao
+import metricas
+from repositorio import COLUNAS_ADICIONAIS_DEMANDAS, RepositorioDemandas
+
+AGORA = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+
+def _dia_juliano_registo(registo):
+    """Expressão SQL (dia juliano) do momento de registo, a partir dos campos 'data' e 'horario'."""
+    return (
+        f"julianday(substr({registo}.data, 7, 4) || '-' || substr({registo}.data, 4, 2) || '-' || "
+        f"substr({registo}.data, 1, 2) || ' ' || {registo}.horario)"
+    )
+
+
+class RepositorioSQLite(RepositorioDemandas):
+    """
+    Armazenamento num ficheiro SQLite local. Cada operação abre a sua própria conexão;
+    só a verificação de versão usa uma conexão mantida aberta.
+    """
+
+    CHAVE_AUTOMATICA = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        # Conexão só de leitura, mantida aberta para que 'PRAGMA data_version' detete escritas de outras conexões
+        self._conexao_versao = None
+        self._trava_versao = threading.Lock()
+
+    @contextmanager
+    def _transacao(self):
+        conn = sqlite3.connect(self.caminho)
+        try:
+            yield conn.cursor()
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _inserir(self, cursor, tabela, dados):
+        cols = ', '.join(dados.keys())
+        placeholders = ', '.join(['?'] * len(dados))
+        cursor.execute(f"INSERT INTO {tabela} ({cols}) VALUES ({placeholders})", tuple(dados.values()))
+        return cursor.lastrowid
+
+    def versao_dados(self):
+        with self._trava_versao:
+            if self._conexao_versao is None:
+                self._conexao_versao = sqlite3.connect(self.caminho, check_same_thread=False)
+            return self._conexao_versao.execute("PRAGMA data_version").fetchone()[0]
+
+    def _tabela_existe(self, cursor, tabela):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,))
+        return cursor.fetchone() is not None
+
+    def inicializar(self):
+        """
+        Cria a base de dados e as tabelas 'demandas' e 'analises_hipossuficiencia' se não existirem.
+        Adiciona novas colunas à tabela 'demandas' se necessário para manter a compatibilidade.
+        """
+        with self._transacao() as cursor:
+            # --- Tabela de Demandas ---
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS demandas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    servidor TEXT NOT NULL,
+                    defensor TEXT NOT NULL,
+                    nome_assistido TEXT NOT NULL,
+                    cpf TEXT,
+                    codigo TEXT NOT NULL,
+                    demanda TEXT NOT NULL,
+                    selecao_demanda TEXT,
+                    status TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    horario TEXT NOT NULL,
+                    numero_processo TEXT,
+                    documento_gerado TEXT 
+                )
+            """)
+
+            cursor.execute("PRAGMA table_info(demandas)")
+            columns = [info[1] for info in cursor.fetchall()]
+
+            for col, tipo in COLUNAS_ADICIONAIS_DEMANDAS.items():
+                if col not in columns:
+                    cursor.execute(f"ALTER TABLE demandas ADD COLUMN {col} {tipo}")
+
+            # --- Carimbo de atualização para as caixas de entrada ---
+            # Preenchido por triggers, para que qualquer escrita (inclusive mesclagens) seja vista pelas caixas de entrada
+            cursor.execute("""
+                UPDATE demandas
+                SET atualizado_em = substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2) || ' ' || horario || '.000'
+                WHERE atualizado_em IS NULL
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS demandas_carimbo_insercao AFTER INSERT ON demandas
+                WHEN NEW.atualizado_em IS NULL
+                BEGIN
+                    UPDATE demandas SET atualizado_em = {AGORA} WHERE id = NEW.id;
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS demandas_carimbo_atualizacao AFTER UPDATE ON demandas
+                WHEN NEW.atualizado_em IS OLD.atualizado_em
+                BEGIN
+                    UPDATE demandas SET atualizado_em = {AGORA} WHERE id = NEW.id;
+                END
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_demandas_atualizado_em ON demandas (atualizado_em)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_demandas_setor_atualizado ON demandas (setor_destino, atualizado_em)")
+            self._criar_tabela_remocoes(cursor)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS demandas_registo_remocao AFTER DELETE ON demandas
+                BEGIN
+                    INSERT INTO demandas_removidas (demanda_id, removido_em) VALUES (OLD.id, {AGORA});
+                END
+            """)
+
+            # --- NOVA: Tabela de Análises de Hipossuficiência ---
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS analises_hipossuficiencia (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo_pessoa TEXT,
+                    documento TEXT NOT NULL,
+                    vulnerabilidades TEXT,
+                    detalhes TEXT,
+                    resultado TEXT,
+                    motivo TEXT,
+                    data_analise TEXT
+                )
+            """)
+
+            # --- Última análise por documento ---
+            # Mantida por trigger, para ligar cada assistido (demandas.cpf) à sua análise mais recente com uma junção indexada
+            ultima_analise_nova = self._criar_tabela_ultima_analise(cursor)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS analises_ultima_insercao AFTER INSERT ON analises_hipossuficiencia
+                BEGIN
+                    INSERT INTO ultima_analise (documento, analise_id, resultado, motivo, data_analise)
+                    VALUES (NEW.documento, NEW.id, NEW.resultado, NEW.motivo, NEW.data_analise)
+                    ON CONFLICT (documento) DO UPDATE SET
+                        analise_id = excluded.analise_id,
+                        resultado = excluded.resultado,
+                        motivo = excluded.motivo,
+                        data_analise = excluded.data_analise
+                    WHERE excluded.analise_id > ultima_analise.analise_id;
+                END
+            """)
+            if ultima_analise_nova:
+                cursor.execute("""
+                    INSERT INTO ultima_analise (documento, analise_id, resultado, motivo, data_analise)
+                    SELECT documento, id, resultado, motivo, data_analise FROM analises_hipossuficiencia
+                    WHERE id IN (SELECT MAX(id) FROM analises_hipossuficiencia GROUP BY documento)
+                """)
+
+            # --- Histórico de status e indicadores ---
+            metricas_novas = not self._tabela_existe(cursor, 'historico_status')
+            metricas.criar_tabelas(cursor, self.CHAVE_AUTOMATICA)
+            self._criar_triggers_metricas(cursor)
+            if metricas_novas:
+                self._preencher_metricas(cursor)
+
+            # --- Índice de assistidos duplicados ---
+            indice_novo = not self._tabela_existe(cursor, 'chaves_assistido')
+            deduplicacao.criar_tabelas(cursor, self.CHAVE_AUTOMATICA)
+            if indice_novo:
+                deduplicacao.reconstruir_indice(cursor)
+
+    def _criar_triggers_metricas(self, cursor):
+        """Cria os triggers que mantêm o histórico de status e os indicadores a cada escrita em 'demandas'."""
+        horas = f"((julianday('now', 'localtime') - {_dia_juliano_registo('NEW')}) * 24)"
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS metricas_insercao AFTER INSERT ON demandas
+            BEGIN
+                {metricas.registar_historico('NULL', AGORA)}
+                {metricas.contar_entrada()}
+                {metricas.mover_backlog('NEW', 1, _dia_juliano_registo('NEW'))}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS metricas_mudanca_status AFTER UPDATE OF status ON demandas
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                {metricas.registar_tempo('leitura', metricas.CONDICAO_LEITURA, horas)}
+                {metricas.registar_tempo('resolucao', metricas.CONDICAO_RESOLUCAO, horas)}
+                {metricas.registar_historico('OLD.status', AGORA)}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS metricas_mudanca_backlog AFTER UPDATE OF status, defensor, servidor ON demandas
+            WHEN OLD.status IS NOT NEW.status OR OLD.defensor IS NOT NEW.defensor OR OLD.servidor IS NOT NEW.servidor
+            BEGIN
+                {metricas.mover_backlog('OLD', -1, _dia_juliano_registo('OLD'))}
+                {metricas.mover_backlog('NEW', 1, _dia_juliano_registo('NEW'))}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS metricas_remocao AFTER DELETE ON demandas
+            BEGIN
+                {metricas.mover_backlog('OLD', -1, _dia_juliano_registo('OLD'))}
+            END
+        """)
+
+    def _preencher_metricas(self, cursor):
+        """Preenche o histórico e os indicadores, acabados de criar, a partir das demandas já existentes."""
+        cursor.execute(f"""
+            INSERT INTO historico_status (demanda_id, status_anterior, status_novo, defensor, servidor, alterado_em)
+            SELECT id, NULL, status, defensor, servidor, datetime({_dia_juliano_registo('demandas')}) FROM demandas
+        """)
+        cursor.execute(f"""
+            INSERT INTO metricas_entrada_diaria (dia, defensor, servidor, total)
+            SELECT {metricas.expressao_dia('demandas')}, defensor, servidor, COUNT(*) FROM demandas GROUP BY 1, 2, 3
+        """)
+        cursor.execute(f"""
+            INSERT INTO metricas_backlog (defensor, servidor, status, total, soma_criacao)
+            SELECT defensor, servidor, status, COUNT(*), SUM({_dia_juliano_registo('demandas')}) FROM demandas GROUP BY 1, 2, 3
+        """)
+
@@ -0,0 +1,298 @@
+"""
+Teste de carga das páginas Streamlit com utilizadores simultâneos.
+
+Cada utilizador simulado corre num processo próprio (o AppTest usa um Runtime
+global do Streamlit, que não suporta sessões em threads paralelas), abre uma sessão
+com streamlit.testing.v1.AppTest e percorre os fluxos habituais da Triagem contra
+uma base de dados temporária partilhada:
+análise de hipossuficiência, registo de demanda com vários processos, busca
+por CPF e nome, edição de um registo e geração de uma declaração.
+
+Uso:
+    python teste_carga.py --usuarios 1,2,4,8 --rodadas 3 --demandas 500
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import time as hora
+
+PAGINA = os.path.join("pages", "01_Triagem.py")
+TEMPO_LIMITE = 120
+
+DEFENSORES = ['Dra. Ana Carolina 1DP', 'Dr. Caio Cesar 2DP', 'Dr. Matheus Rocha 3DP', 'Dra. Janaína Araújo 6DP']
+SERVIDORES = ["THAIS", "RAYSSA", "WELDER"]
+NOMES = ["MARIA", "JOSE", "ANA", "JOAO", "FRANCISCA", "ANTONIO", "ADRIANA", "CARLOS", "JULIANA", "PAULO"]
+SOBRENOMES = ["SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "LIMA", "PEREIRA", "COSTA", "RODRIGUES", "ALMEIDA", "NASCIMENTO"]
+
+# Cada processo usa uma faixa própria de CPFs; esta é a das demandas semeadas
+_contador_cpf = iter(range(10**9, 2 * 10**9))
+
+
+def novo_cpf():
+    return f"{next(_contador_cpf):011d}"
+
+
+def novo_nome():
+    return f"{random.choice(NOMES)} {random.choice(SOBRENOMES)} {random.choice(SOBRENOMES)}"
+
+
+def preparar_banco(pasta, quantidade):
+    """
+    Cria uma base de dados temporária com 'quantidade' demandas e análises.
+    As variáveis de ambiente têm de ser definidas antes do primeiro import de 'database'.
+    Retorna a lista de (id, cpf) das demandas criadas.
+    """
+    os.environ["DEMANDAS_DB"] = os.path.join(pasta, "carga.db")
+    os.environ["DEMANDAS_BACKUP_INTERVALO_HORAS"] = "0"
+    import database as db
+
+    for i in range(quantidade):
+        cpf = novo_cpf()
+        db.adicionar_demanda(
+            servidor=random.choice(SERVIDORES), defensor=random.choice(DEFENSORES),
+            nome_assistido=novo_nome(), cpf=cpf, codigo=f"{i:05d}-00",
+            demanda="Demanda gerada para teste de carga.", selecao_demanda="",
+            status=random.choice(['Pendente', 'Lido', 'Resolvido']),
+            data="01/01/2025", horario="10:00:00", numero_processo="", documento_gerado=""
+        )
+        if i % 3 == 0:
+            db.adicionar_analise(
+                tipo_pessoa="Pessoa Física", documento=cpf, vulnerabilidades="",
+                detalhes="{}", resultado="Aprovado", motivo="Critério Econômico",
+                data_analise="01/01/2025 10:00:00"
+            )
+
+    df = db.snapshot_demandas()
+    return list(zip(df['id'].tolist(), df['cpf'].tolist()))
+
+
+def _por_rotulo(elementos, rotulo):
+    return next(e for e in elementos if e.label == rotulo)
+
+
+def _limpar_widgets_obsoletos(at):
+    """
+    Depois de um st.rerun(), o AppTest mantém na árvore widgets da execução anterior
+    que já saíram da sessão: a execução seguinte falharia ao ler o seu valor ou chamaria
+    os seus callbacks. Num navegador eles simplesmente desaparecem; aqui são retirados da árvore.
+    """
+    from streamlit.testing.v1.element_tree import Block, Widget
+
+    def limpar(bloco):
+        for indice, filho in list(bloco.children.items()):
+            if isinstance(filho, Block):
+                limpar(filho)
+            elif isinstance(filho, Widget) and filho.id not in at.session_state:
+                del bloco.children[indice]
+
+    limpar(at.main)
+    limpar(at.sidebar)
+
+
+class Sessao:
+    """Uma sessão de navegador simulada que cronometra cada interação."""
+
+    def __init__(self, resultados):
+        from streamlit.testing.v1 import AppTest
+        self.resultados = resultados
+        self.at = AppTest.from_file(PAGINA, default_timeout=TEMPO_LIMITE)
+
+    def executar(self, acao):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            self.at.run()
+            mensagens = [str(e.value) for e in self.at.exception] + [str(e.value) for e in self.at.error]
+            if mensagens:
+                erro = mensagens[0]
+        except Exception as e:
+            erro = str(e) or type(e).__name__
+        self.resultados.append((acao, time.perf_counter() - inicio, erro))
+        return erro is None
+
+
+def fluxo_analise(resultados, semeadas):
+    s = Sessao(resultados)
+    s.executar("abrir_pagina")
+    s.at.text_input(key="hipo_cpf").input(novo_cpf())
+    s.at.number_input(key="hipo_renda_ind").set_value(1200.0)
+    s.at.number_input(key="hipo_renda_fam").set_value(2500.0)
+    s.at.button(key="hipo_validar").click()
+    s.executar("salvar_analise")
+
+
+def fluxo_registo(resultados, semeadas):
+    s = Sessao(resultados)
+    s.executar("abrir_pagina")
+    s.at.selectbox(key="registro_defensor").select(random.choice(DEFENSORES))
+    s.executar("selecionar_defensor")
+
+    s.at.selectbox(key="servidor").select(random.choice(SERVIDORES))
+    s.at.text_input(key="nome_assistido").input(novo_nome())
+    s.at.text_input(key="codigo").input("99999-00")
+    s.at.text_input(key="cpf").input(novo_cpf())
+    s.executar("buscar_nome_por_cpf")
+
+    for _ in range(2):
+        _por_rotulo(s.at.button, "➕ Adicionar processo").click()
+        s.executar("adicionar_processo")
+    for i in range(3):
+        s.at.text_input(key=f"processo_{i}").input(f"800{random.randint(1000, 9999)}-00.2025.8.05.0256")
+
+    s.at.text_area(key="demanda_desc").input("Registo criado pelo teste de carga.")
+    _por_rotulo(s.at.button, "✔️ Guardar").click()
+    s.executar("submeter_registo")
+    _limpar_widgets_obsoletos(s.at)
+    _por_rotulo(s.at.button, "✔️ Sim, guardar").click()
+    s.executar("confirmar_registo")
+
+
+def fluxo_busca(resultados, semeadas):
+    demanda_id, cpf = random.choice(semeadas)
+    s = Sessao(resultados)
+    s.executar("abrir_pagina")
+    _por_rotulo(s.at.text_input, "Buscar por CPF").input(cpf)
+    s.executar("buscar_por_cpf")
+    _por_rotulo(s.at.text_input, "Buscar por CPF").input("")
+    _por_rotulo(s.at.text_input, "Buscar por Nome do Assistido").input(random.choice(SOBRENOMES))
+    s.executar("buscar_por_nome")
+
+
+def fluxo_edicao(resultados, semeadas):
+    demanda_id, cpf = random.choice(semeadas)
+    s = Sessao(resultados)
+    s.executar("abrir_pagina")
+    _por_rotulo(s.at.text_input, "Buscar por CPF").input(cpf)
+    s.executar("buscar_por_cpf")
+    s.at.text_input(key=f"nome_{demanda_id}").input(novo_nome())
+    s.at.text_input(key=f"codigo_{demanda_id}").input(f"{random.randint(0, 99999):05d}-01")
+    _por_rotulo(s.at.button, "💾 Salvar Alterações").click()
+    s.executar("salvar_edicao")
+
+
+def fluxo_declaracao(resultados, semeadas):
+    demanda_id, cpf = random.choice(semeadas)
+    s = Sessao(resultados)
+    s.executar("abrir_pagina")
+    _por_rotulo(s.at.text_input, "Buscar por CPF").input(cpf)
+    s.executar("buscar_por_cpf")
+    _por_rotulo(s.at.button, "📄 Gerar/Enviar Solicitação").click()
+    s.executar("abrir_gerador")
+    s.at.selectbox(key=f"doc_type_{demanda_id}").select("Declaração de comparecimento")
+    s.executar("escolher_documento")
+    s.at.time_input(key=f"hinicio_{demanda_id}").set_value(hora(9, 0))
+    s.at.time_input(key=f"hfim_{demanda_id}").set_value(hora(9, 30))
+    s.at.button(key=f"gerar_dec_comp_{demanda_id}").click()
+    s.executar("gerar_declaracao")
+
+
+FLUXOS = [fluxo_analise, fluxo_registo, fluxo_busca, fluxo_edicao, fluxo_declaracao]
+
+
+def utilizador(indice, semeadas, rodadas, semente, barreira, fila):
+    """
+    Processo de um utilizador simulado: percorre todos os fluxos 'rodadas' vezes, por ordem aleatória.
+    Envia pela fila os resultados e os instantes de início e fim.
+    """
+    global _contador_cpf
+    _contador_cpf = iter(range((indice + 2) * 10**9, (indice + 3) * 10**9))
+    random.seed(None if semente is None else semente + indice)
+    resultados = []
+    inicio = fim = time.time()
+    try:
+        # Todos começam ao mesmo tempo, depois de importar o Streamlit
+        barreira.wait(timeout=TEMPO_LIMITE)
+        inicio = time.time()
+        for _ in range(rodadas):
+            for fluxo in random.sample(FLUXOS, len(FLUXOS)):
+                inicio_fluxo = time.perf_counter()
+                try:
+                    fluxo(resultados, semeadas)
+                except Exception as e:
+                    # Um widget em falta (ex.: página interrompida por um erro) conta como erro do fluxo,
+                    # numa linha à parte para não misturar o tempo decorrido com o das ações
+                    resultados.append((
+                        "falha_fluxo", time.perf_counter() - inicio_fluxo, f"{fluxo.__name__}: {type(e).__name__}: {e}"
+                    ))
+        fim = time.time()
+    except Exception as e:
+        resultados.append(("utilizador", 0.0, f"{type(e).__name__}: {e}"))
+    finally:
+        fila.put((resultados, inicio, fim))
+
+
+def simular(usuarios, semeadas, rodadas, semente):
+    """Corre 'usuarios' processos em simultâneo e retorna (resultados, duração em segundos)."""
+    contexto = multiprocessing.get_context("spawn")
+    barreira = contexto.Barrier(usuarios)
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=utilizador, args=(i, semeadas, rodadas, semente, barreira, fila))
+        for i in range(usuarios)
+    ]
+    for processo in processos:
+        processo.start()
+    respostas = [fila.get() for _ in processos]
+    for processo in processos:
+        processo.join()
+
+    resultados = [r for resposta in respostas for r in resposta[0]]
+    duracao = max(r[2] for r in respostas) - min(r[1] for r in respostas)
+    return resultados, duracao
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def relatorio(usuarios, resultados, segundos):
+    erros = [r for r in resultados if r[2] is not None]
+    bloqueios = [r for r in erros if "database is locked" in r[2]]
+    print(f"\n=== {usuarios} utilizador(es) simultâneo(s) ===")
+    print(f"Ações: {len(resultados)}  |  Duração: {segundos:.1f}s  |  Vazão: {len(resultados) / segundos:.2f} ações/s")
+    print(f"Erros: {len(erros)}  |  'database is locked': {len(bloqueios)}")
+    print(f"{'Ação':<22}{'N':>6}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'máx (ms)':>11}{'erros':>7}")
+
+    por_acao = {}
+    for acao, duracao, erro in resultados:
+        por_acao.setdefault(acao, []).append((duracao, erro))
+    for acao, medidas in sorted(por_acao.items()):
+        tempos = [d * 1000 for d, _ in medidas]
+        falhas = sum(1 for _, e in medidas if e is not None)
+        print(
+            f"{acao:<22}{len(medidas):>6}{percentil(tempos, 50):>11.0f}{percentil(tempos, 95):>11.0f}"
+            f"{percentil(tempos, 99):>11.0f}{max(tempos):>11.0f}{falhas:>7}"
+        )
+    for acao, _, erro in erros[:5]:
+        print(f"  ! {acao}: {erro}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga das páginas Streamlit.")
+    parser.add_argument("--usuarios", default="1,2,4,8", help="Níveis de simultaneidade, separados por vírgula.")
+    parser.add_argument("--rodadas", type=int, default=2, help="Vezes que cada utilizador percorre todos os fluxos.")
+    parser.add_argument("--demandas", type=int, default=300, help="Demandas criadas na base de dados temporária.")
+    parser.add_argument("--semente", type=int, default=None, help="Semente aleatória, para repetir uma execução.")
+    args = parser.parse_args()
+
+    random.seed(args.semente)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"A preparar a base de dados temporária com {args.demandas} demandas...")
+        semeadas = preparar_banco(pasta, args.demandas)
+
+        for usuarios in [int(n) for n in args.usuarios.split(",")]:
+            resultados, duracao = simular(usuarios, semeadas, args.rodadas, args.semente)
+            relatorio(usuarios, resultados, duracao)
+
+if __name__ == "__main__":
+    main()